@@ -0,0 +1,155 @@
+#! /usr/bin/python3.8 Python3.8
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cursors import encode_cursor
+
+
+EXCERPT_LENGTH: int = 280  # In characters
+
+
+def excerpt(body: str) -> str:
+    '''Truncate an article body on a word boundary for summary listings
+    '''
+    if len(body) <= EXCERPT_LENGTH:
+        return body
+
+    return body[:EXCERPT_LENGTH].rsplit(' ', 1)[0].rstrip() + '...'
+
+
+def summarize(article: Dict[str, Any]) -> Dict[str, Any]:
+    '''Summary representation of a full article, with an excerpt of its body
+    '''
+    summary: Dict[str, Any] = {
+        key: value
+        for key, value in article.items()
+        if key != 'body'
+    }
+    summary['excerpt'] = excerpt(article['body'])
+
+    return summary
+
+
+class ArticleList:
+    '''A page of articles ordered from newest to oldest, indexed by article ID
+    so that cached pages can be patched in place when articles change
+    '''
+
+    def __init__(
+            self,
+            articles: List[Dict[str, Any]],
+            *,
+            next_cursor: Optional[str] = None,
+            summary: bool = False,
+            limit: Optional[int] = None,
+            keys: Optional[List[Dict[str, Any]]] = None,
+            ) -> None:
+        self.articles: List[Dict[str, Any]] = articles
+        self.next_cursor: Optional[str] = next_cursor
+        self.summary: bool = summary
+        self.limit: Optional[int] = limit
+        # Index keys of the articles, in the same order, to rebuild the
+        # cursor when the list is truncated
+        self.keys: Optional[List[Dict[str, Any]]] = keys
+        self._index: Dict[str, int] = {}
+        self._encoded: Optional[Tuple[str, str]] = None
+
+        self._build_index()
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._index
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ArticleList':
+        return cls(
+            data['articles'],
+            next_cursor=data.get('next_cursor'),
+            limit=data.get('limit'),
+            keys=data.get('keys'),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'articles': self.articles,
+            'next_cursor': self.next_cursor,
+            'limit': self.limit,
+            'keys': self.keys,
+        }
+
+    def encoded(
+            self,
+            *,
+            encoder: Callable[['ArticleList'], str],
+            ) -> Tuple[str, str]:
+        '''Encoded response body and its ETag, computed once and reused until
+        the list changes
+        '''
+        if self._encoded is None:
+            body: str = encoder(self)
+            etag: str = hashlib.md5(body.encode('utf-8')).hexdigest()
+
+            self._encoded = (body, f'"{etag}"')
+
+        return self._encoded
+
+    def prepend(
+            self,
+            article: Dict[str, Any],
+            *,
+            key: Dict[str, Any],
+            ) -> None:
+        '''Add a newly published article to the top of the list
+
+        The list is then truncated to its limit and the next page starts
+        after its new last article. Without the index keys of its articles,
+        the list cannot be truncated and only grows.
+        '''
+        if article['id'] in self._index:
+            return None
+
+        if self.summary:
+            article = summarize(article)
+
+        self.articles = [article, *self.articles]
+
+        if self.keys is not None:
+            self.keys = [key, *self.keys]
+
+            if self.limit is not None and len(self.articles) > self.limit:
+                self.articles = self.articles[:self.limit]
+                self.keys = self.keys[:self.limit]
+
+                try:
+                    self.next_cursor = encode_cursor(self.keys[-1])
+                except RuntimeError:
+                    # No signing key: listed without pagination
+                    self.next_cursor = None
+
+        self._build_index()
+        self._changed()
+
+    def update_likes(self, article_id: str, likes: int) -> bool:
+        '''Patch the likes count of an article; returns False if the article
+        is not in the list
+        '''
+        position: Optional[int] = self._index.get(article_id)
+
+        if position is None:
+            return False
+
+        self.articles[position] = {**self.articles[position], 'likes': likes}
+        self._changed()
+
+        return True
+
+    def _changed(self) -> None:
+        self._encoded = None
+
+    def _build_index(self) -> None:
+        self._index = {
+            article['id']: position
+            for position, article in enumerate(self.articles)
+        }
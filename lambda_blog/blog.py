@@ -1,35 +1,165 @@
 #! /usr/bin/python3.8 Python3.8
+import collections
+import concurrent.futures
 from datetime import datetime
+import functools
 import hashlib
 import json
 import logging
 import os
+import random
+import re
 import time
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
-import boto3
 import botocore
 
+from articles import ArticleList, excerpt
+from aws_clients import get_client
+from cache import MISSING, LruCache, SwrCache
+from cache_backends import backend_from_env
+from cursors import decode_cursor, encode_cursor
 from error_handling import CustomException, ErrorMsg
+from export import (
+    EXPORT_MAX_SEGMENTS,
+    EXPORT_TOTAL_SEGMENTS,
+    scan_page,
+    to_ndjson,
+)
+from request_log import RequestLogBuffer
+from request_context import RequestContext
+from router import Router
+from structured_log import StructuredLogger
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.WARNING)
 
-
-MAX_CACHE_AGE: int = 120  # In seconds
-CACHE_LATEST_ARTICLES: Dict[str, Union[int, list]] = {
-    'last_update': time.time(),
-    'articles': [],
-}
+# Request/response payloads are logged at DEBUG level, a one-line summary of
+# each invocation at INFO level (see LOG_* variables in structured_log)
+LOG: StructuredLogger = StructuredLogger.from_env()
+
+# Actions are registered on it by the route decorators below
+ROUTER: Router = Router()
+
+LATEST_ARTICLES_LIMIT: int = 50
+SUMMARY_ATTRIBUTES: List[str] = [
+    'id',
+    'publish-timestamp',
+    'publisher-email',
+    'publisher-name',
+    'title',
+    'likes',
+    'excerpt',
+]
+
+# Lets browsers and CDNs reuse article listings, revalidating them with ETag
+HTTP_CACHE_MAX_AGE: int = int(os.environ.get('HTTP_CACHE_MAX_AGE', 60))
+HTTP_CACHE_STALE_AGE: int = int(os.environ.get('HTTP_CACHE_STALE_AGE', 300))
+
+# Articles are served from cache for up to MAX_CACHE_AGE seconds; after that
+# and until MAX_CACHE_STALE_AGE, stale articles are served while refreshed.
+# Publishing and liking articles update the cache in place (write-through).
+MAX_CACHE_AGE: int = int(os.environ.get('CACHE_SOFT_TTL', 600))
+MAX_CACHE_STALE_AGE: int = int(os.environ.get('CACHE_HARD_TTL', 3600))
+# Failed queries (e.g. a table that is still being created) are not retried
+# by every request during this period
+MAX_CACHE_ERROR_AGE: int = int(os.environ.get('CACHE_NEGATIVE_TTL', 5))
+LATEST_ARTICLES_CACHE: SwrCache = SwrCache(
+    soft_ttl=MAX_CACHE_AGE,
+    hard_ttl=MAX_CACHE_STALE_AGE,
+    negative_ttl=MAX_CACHE_ERROR_AGE,
+)
+# Other pages (custom limit or cursor) are cached separately, evicting the
+# least recently used page when full
+MAX_CACHED_PAGES: int = int(os.environ.get('CACHE_MAX_PAGES', 32))
+PageKey = Tuple[str, int, str]  # Fields, limit and cursor
+ARTICLE_PAGES_CACHE: 'collections.OrderedDict[PageKey, SwrCache]' = \
+    collections.OrderedDict()
+
+# Single articles (get-article) are cached by ID, bounded by number of
+# articles and total size in characters
+ARTICLES_CACHE: LruCache = LruCache(
+    max_items=int(os.environ.get('ARTICLE_CACHE_MAX_ITEMS', 500)),
+    max_size=int(os.environ.get('ARTICLE_CACHE_MAX_SIZE', 20_000_000)),
+    ttl=int(os.environ.get('ARTICLE_CACHE_TTL', 600)),
+)
+MAX_ARTICLES_PER_REQUEST: int = 100
+
+# When above zero, likes are counted in this many counter items per article
+# (chosen at random) instead of the article item, to spread write load
+LIKES_SHARD_COUNT: int = int(os.environ.get('LIKES_SHARD_COUNT', 0))
+LIKES_SHARD_ITEM_TYPE: str = 'likes-shard'
+
+# Bulk publishing puts articles concurrently (BatchWriteItem can't check
+# that an article doesn't exist yet, so it would reset existing likes)
+MAX_ARTICLES_PER_PUBLISH: int = int(
+    os.environ.get('MAX_ARTICLES_PER_PUBLISH', 1000))
+PUBLISH_MAX_WORKERS: int = int(os.environ.get('PUBLISH_MAX_WORKERS', 16))
+PUBLISH_STATUS_PUBLISHED: str = 'published'
+PUBLISH_STATUS_EXISTS: str = 'already-exists'
+PUBLISH_STATUS_DUPLICATE: str = 'duplicate'
+PUBLISH_STATUS_INVALID: str = 'invalid'
+PUBLISH_STATUS_FAILED: str = 'failed'
+
+# Like request tokens seen recently, to short-circuit client retries; they
+# are also stored in DynamoDB (with a TTL) to dedupe across containers
+LIKE_TOKEN_TTL: int = int(os.environ.get('LIKE_TOKEN_TTL', 600))
+LIKE_TOKEN_PATTERN: Pattern = re.compile(r'[A-Za-z0-9_-]{8,128}')
+LIKE_TOKEN_ID_PREFIX: str = 'like-token#'
+LIKE_TOKEN_ITEM_TYPE: str = 'like-token'
+LIKE_TOKEN_CACHE_MAX_ITEMS: int = int(
+    os.environ.get('LIKE_TOKEN_CACHE_MAX_ITEMS', 10_000))
+LIKE_TOKENS_CACHE: LruCache = LruCache(
+    max_items=LIKE_TOKEN_CACHE_MAX_ITEMS,
+    max_size=LIKE_TOKEN_CACHE_MAX_ITEMS,  # Every token has a size of 1
+    ttl=LIKE_TOKEN_TTL,
+)
+
+DDB_BATCH_GET_QUOTA: int = 100  # Max keys per BatchGetItem call
+DDB_BATCH_MAX_ATTEMPTS: int = 5
+
+# Listings return full articles or summaries with a body excerpt; summaries
+# are read from an index that doesn't project article bodies
+FIELDS_FULL: str = 'full'
+FIELDS_SUMMARY: str = 'summary'
 TIME_TO_LIVE_ATTR_NAME: str = os.environ['DYNAMODB_TTL_ATTR_NAME']
 TIME_TO_LIVE_DURATION: int = int(os.environ['DYNAMODB_TTL_DURATION'])
 
+# Second-level cache shared by all containers, checked before the DynamoDB
+# index when the in-process cache misses
+SHARED_CACHE = backend_from_env()
+SHARED_CACHE_KEY_LATEST_ARTICLES: str = 'latest-articles'
+
+# 'async' buffers API request info for a background writer; 'sync' writes it
+# to DynamoDB before the request is served. Async items buffered when a
+# container is reaped are lost, the invocation summary logs how many are
+# pending (request_log_pending) when each invocation returns.
+REQUEST_LOG_MODE: str = os.environ.get('REQUEST_LOG_MODE', 'async')
+REQUEST_LOG: RequestLogBuffer = RequestLogBuffer(
+    max_size=int(os.environ.get('REQUEST_LOG_MAX_SIZE', 1000)),
+    overflow_policy=os.environ.get('REQUEST_LOG_OVERFLOW', 'drop-oldest'),
+    max_age=float(os.environ.get('REQUEST_LOG_MAX_AGE', 10)),
+)
+
 
 def wrap_handler(handler):
     def inner(event, context):
-        print('REQUEST:')
-        print(json.dumps(event))
+        started_at: float = time.monotonic()
+
+        # Decided once, so that sampled invocations are logged in full
+        sampled: bool = LOG.sample()
+
+        LOG.debug('Request', sampled=sampled, event=event)
 
         if event.get('httpMethod') == 'OPTIONS':
             response = {
@@ -46,8 +176,20 @@ def wrap_handler(handler):
         else:
             response = handler(event, context)
 
-        print('RESPONSE:')
-        print(json.dumps(response))
+        LOG.debug('Response', sampled=sampled, response=response)
+        LOG.info(
+            'Request handled',
+            sampled=sampled,
+            request_id=lambda: event.get(
+                'requestContext', {}).get('requestId'),
+            method=lambda: event.get('httpMethod'),
+            action=lambda: (event.get('queryStringParameters') or {}).get(
+                'action'),
+            status_code=response['statusCode'],
+            response_size=lambda: len(response['body']),
+            request_log_pending=lambda: len(REQUEST_LOG),
+            duration_ms=round((time.monotonic() - started_at) * 1000, 1),
+        )
 
         return response
 
@@ -58,28 +200,25 @@ def wrap_handler(handler):
 def handler(event: dict, context: Any):
     status_code: int = 200
     res_body: Dict[str, Any] = {}
+    raw_body: Optional[str] = None  # Pre-encoded body, replaces res_body
+    res_headers: Dict[str, str] = {}
+
+    # Shared by request logging and the action, parsing the event only once
+    request: RequestContext = RequestContext(event)
 
     try:
         try:
-            store_http_request_info(event=event)
+            store_http_request_info(request=request)
         except Exception as error:
             logger.error(ErrorMsg.STORE_HTTP_REQUEST_INFO)
             logger.exception(error)
 
-        try:
-            action: str = event['queryStringParameters']['action']
-        except (TypeError, KeyError) as error:
-            raise CustomException(ErrorMsg.MISSING_ACTION_PARAM) from error
-
-        res_body['action']: str = action
+        if not request.action:
+            raise CustomException(ErrorMsg.MISSING_ACTION_PARAM)
 
-        try:
-            executor: Callable[[dict], dict] = action_mapper(action=action)
-        except KeyError as error:
-            raise CustomException(ErrorMsg.INVALID_ACTION.format(action)) \
-                from error
+        res_body['action']: str = request.action
 
-        results: dict = executor(event=event)
+        results: dict = ROUTER.dispatch(request=request)
 
         res_body['message']: str = results['public_message']
         res_body['data']: dict = results.get('public_data')
@@ -87,6 +226,9 @@ def handler(event: dict, context: Any):
         if 'status_code' in results:
             status_code: int = results['status_code']
 
+        res_headers.update(results.get('headers', {}))
+        raw_body = results.get('raw_body')
+
     except CustomException as error:
         logger.exception(error)
 
@@ -107,178 +249,406 @@ def handler(event: dict, context: Any):
                 'Access-Control-Allow-Headers': '*',
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+                **res_headers,
             },
-            'body': json.dumps(res_body),
+            'body': json.dumps(res_body) if raw_body is None else raw_body,
         }
 
 
-def store_http_request_info(*, event: dict) -> None:
-    timestamp = round(event['requestContext']['requestTimeEpoch'] / 1000)
+def store_http_request_info(*, request: RequestContext) -> None:
+    item: Dict[str, dict] = http_request_item(request=request)
 
-    if event['headers']['CloudFront-Is-Desktop-Viewer'] is True:
-        device_type = 'Desktop'
+    if REQUEST_LOG_MODE == 'async':
+        REQUEST_LOG.put(item)
+        return None
 
-    elif event['headers']['CloudFront-Is-Mobile-Viewer'] is True:
-        device_type = 'Mobile'
+    client = get_client('dynamodb')
 
-    elif event['headers']['CloudFront-Is-SmartTV-Viewer'] is True:
-        device_type = 'SmartTV'
+    client.put_item(
+        TableName=os.environ['DYNAMODB_TABLE_NAME'],
+        Item=item,
+        # Make sure we don't override a previously entered article
+        ConditionExpression='attribute_not_exists(#id)',
+        ExpressionAttributeNames={
+            '#id': 'id',
+        },
+    )
 
-    elif event['headers']['CloudFront-Is-Tablet-Viewer'] is True:
-        device_type = 'Tablet'
 
-    else:
-        device_type = 'Unknown'
+def http_request_item(*, request: RequestContext) -> Dict[str, dict]:
+    '''Build the DynamoDB item recording an API request
+    '''
+    event: dict = request.event
+    timestamp = round(event['requestContext']['requestTimeEpoch'] / 1000)
 
     country_type = 'S'
-    country = event['headers'].get('CloudFront-Viewer-Country')
+    country = request.country
 
-    if type(country) is not str:
+    if country is None:
         country_type = 'NULL'
         country = True
 
-    try:
-        body = json.loads(event['body'])
+    if type(request.body) is dict:
         article_id_type = 'S'
-        article_id = body.get('article_id', '')
-    except Exception:
+        article_id = str(request.body.get('article_id', ''))
+    else:
         article_id_type = 'BOOL'
         article_id = True
 
-    client = boto3.client('dynamodb')
-
-    client.put_item(
-        TableName=os.environ['DYNAMODB_TABLE_NAME'],
-        Item={
-            'id': {
-                'S': event['requestContext']['requestId'],
-            },
-            'item-type': {
-                'S': 'api-request',
-            },
-            'http-method': {
-                'S': event['httpMethod'],
-            },
-            'timestamp': {
-                'N': str(timestamp),
-            },
-            'datetime': {
-                'S': date_str(timestamp),
-            },
-            'ip-address': {
-                'S': event['requestContext']['identity']['sourceIp'],
-            },
-            'user-agent': {
-                'S': event['requestContext']['identity']['userAgent'],
-            },
-            'origin': {
-                'S': event['headers'].get('origin', ''),
-            },
-            'country-code': {
-                country_type: country,
-            },
-            'device-type': {
-                'S': device_type,
-            },
-            'action': {
-                'S': event['queryStringParameters'].get('action', ''),
-            },
-            'article-id': {
-                article_id_type: article_id,
-            },
-            # The article will be auto-deleted by Dynamo after certain time
-            TIME_TO_LIVE_ATTR_NAME: {
-                'N': str(timestamp + TIME_TO_LIVE_DURATION),
-            },
+    return {
+        'id': {
+            'S': event['requestContext']['requestId'],
         },
-        # Make sure we don't override a previously entered article
-        ConditionExpression='attribute_not_exists(#id)',
-        ExpressionAttributeNames={
-            '#id': 'id',
+        'item-type': {
+            'S': 'api-request',
+        },
+        'http-method': {
+            'S': request.method,
+        },
+        'timestamp': {
+            'N': str(timestamp),
+        },
+        'datetime': {
+            'S': date_str(timestamp),
+        },
+        'ip-address': {
+            'S': event['requestContext']['identity']['sourceIp'],
+        },
+        'user-agent': {
+            'S': event['requestContext']['identity']['userAgent'],
+        },
+        'origin': {
+            'S': request.headers.get('origin', ''),
+        },
+        'country-code': {
+            country_type: country,
         },
+        'device-type': {
+            'S': request.device_type,
+        },
+        'action': {
+            'S': request.action or '',
+        },
+        'article-id': {
+            article_id_type: article_id,
+        },
+        # The article will be auto-deleted by Dynamo after certain time
+        TIME_TO_LIVE_ATTR_NAME: {
+            'N': str(timestamp + TIME_TO_LIVE_DURATION),
+        },
+    }
+
+
+@ROUTER.route('get-latest-articles')
+def get_latest_articles(*, request: RequestContext):
+    fields, limit, cursor = page_params(request=request)
+
+    if is_default_page(fields=fields, limit=limit, cursor=cursor):
+        loader: Callable[[], ArticleList] = load_latest_articles
+    else:
+        loader: Callable[[], ArticleList] = functools.partial(
+            query_latest_articles,
+            limit=limit,
+            cursor=cursor,
+            summary=fields == FIELDS_SUMMARY,
+        )
+
+    page_cache: SwrCache = article_page_cache(
+        fields=fields,
+        limit=limit,
+        cursor=cursor,
     )
 
+    articles: ArticleList = page_cache.get(loader=loader)
 
-def action_mapper(*, action: str) -> Callable[[dict], dict]:
-    mapper: dict = {
-        'get-latest-articles': get_latest_articles,
-        'publish-article': put_article,
-        'like-article': like_article,
+    # Encoded once per cached list, cache hits skip JSON serialization
+    body, etag = articles.encoded(encoder=encode_latest_articles)
+
+    cache_headers: Dict[str, str] = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={HTTP_CACHE_MAX_AGE}, '
+                         f'stale-while-revalidate={HTTP_CACHE_STALE_AGE}',
     }
 
-    return mapper[action]
+    # No Last-Modified: when a list was loaded or patched differs between
+    # containers, while its ETag only depends on its content
+    not_modified: bool = is_not_modified(request=request, etag=etag)
+
+    if not_modified:
+        return {
+            'status_code': 304,
+            'public_message': 'Not modified',
+            'raw_body': '',
+            'headers': cache_headers,
+        }
+
+    return {
+        'public_message': 'Articles retrieved',
+        'public_data': {
+            'articles': articles.articles,
+            'next_cursor': articles.next_cursor,
+        },
+        'raw_body': body,
+        'headers': cache_headers,
+    }
+
+
+def page_params(*, request: RequestContext) -> Tuple[str, int, Optional[str]]:
+    '''Fields, page size and cursor from the "fields", "limit" and "cursor"
+    query strings
+    '''
+    params: Dict[str, str] = request.params
+    fields: str = params.get('fields', FIELDS_FULL)
+
+    if fields not in [FIELDS_FULL, FIELDS_SUMMARY]:
+        raise CustomException(ErrorMsg.INVALID_FIELDS.format(fields))
+
+    try:
+        limit: int = int(params.get('limit', LATEST_ARTICLES_LIMIT))
 
+        if not 1 <= limit <= LATEST_ARTICLES_LIMIT:
+            raise ValueError(f'Limit out of range: {limit}')
 
-def is_cache_valid(
+    except ValueError as error:
+        raise CustomException(
+            ErrorMsg.INVALID_LIMIT.format(LATEST_ARTICLES_LIMIT)) from error
+
+    return fields, limit, params.get('cursor') or None
+
+
+def is_default_page(*, fields: str, limit: int, cursor: Optional[str]) -> bool:
+    return fields == FIELDS_FULL and limit == LATEST_ARTICLES_LIMIT and \
+        cursor is None
+
+
+def article_page_cache(
+        *,
+        fields: str,
+        limit: int,
+        cursor: Optional[str],
+        ) -> SwrCache:
+    if is_default_page(fields=fields, limit=limit, cursor=cursor):
+        return LATEST_ARTICLES_CACHE
+
+    key: PageKey = (fields, limit, cursor or '')
+
+    if key in ARTICLE_PAGES_CACHE:
+        ARTICLE_PAGES_CACHE.move_to_end(key)
+        return ARTICLE_PAGES_CACHE[key]
+
+    page_cache: SwrCache = SwrCache(
+        soft_ttl=MAX_CACHE_AGE,
+        hard_ttl=MAX_CACHE_STALE_AGE,
+        negative_ttl=MAX_CACHE_ERROR_AGE,
+    )
+
+    ARTICLE_PAGES_CACHE[key] = page_cache
+
+    if len(ARTICLE_PAGES_CACHE) > MAX_CACHED_PAGES:
+        ARTICLE_PAGES_CACHE.popitem(last=False)
+
+    return page_cache
+
+
+def cached_article_pages(*, first_pages_only: bool = False) -> List[SwrCache]:
+    '''Caches of every page of articles, or of the pages without a cursor
+    '''
+    caches: List[Tuple[Optional[str], SwrCache]] = [
+        (None, LATEST_ARTICLES_CACHE),
+        *[
+            (cursor or None, cache)
+            for (_, _, cursor), cache in list(ARTICLE_PAGES_CACHE.items())
+        ],
+    ]
+
+    return [
+        cache
+        for cursor, cache in caches
+        if not first_pages_only or cursor is None
+    ]
+
+
+def update_article_pages(
         *,
-        now: Optional[Union[int, None]] = None,
-        ) -> Union[dict, bool]:
-    '''Validates whether articles cache is fresh enough to be used
+        updater: Callable[[ArticleList], Any],
+        first_pages_only: bool = False,
+        ) -> None:
+    '''Apply a write-through update to every cached page of articles
     '''
-    if type(now) is not int:
-        now = int(time.time())
+    for cache in cached_article_pages(first_pages_only=first_pages_only):
+        cache.update(updater=updater)
 
-    if now < CACHE_LATEST_ARTICLES['last_update'] + MAX_CACHE_AGE:
-        return CACHE_LATEST_ARTICLES['articles']
+
+def is_not_modified(
+        *,
+        request: RequestContext,
+        etag: str,
+        ) -> bool:
+    '''Evaluates If-None-Match conditional request headers
+    '''
+    headers: Dict[str, str] = request.headers
+
+    if (if_none_match := headers.get('if-none-match')) is not None:
+        client_etags: List[str] = [
+            tag.strip().replace('W/', '', 1)
+            for tag in if_none_match.split(',')
+        ]
+
+        return etag in client_etags or '*' in client_etags
 
     return False
 
 
-def update_cache(*, articles: List[Dict[str, Any]]) -> None:
-    CACHE_LATEST_ARTICLES['articles'] = articles
-    CACHE_LATEST_ARTICLES['last_update']: int = int(time.time())
+def encode_latest_articles(articles: ArticleList) -> str:
+    return json.dumps({
+        'action': 'get-latest-articles',
+        'message': 'Articles retrieved',
+        'data': {
+            'articles': articles.articles,
+            'next_cursor': articles.next_cursor,
+        },
+    })
 
-    return None
 
+def load_latest_articles() -> ArticleList:
+    '''Load articles from the shared cache tier, falling back to DynamoDB
+    '''
+    try:
+        cached: Optional[dict] = SHARED_CACHE.get(
+            SHARED_CACHE_KEY_LATEST_ARTICLES)
+
+        if type(cached) is dict:
+            return ArticleList.from_dict(cached)
+
+    except Exception as error:
+        logger.exception(error)
 
-def get_latest_articles(*, event: dict):
-    if cached_articles := is_cache_valid():
-        articles: List[Dict[str, Any]] = cached_articles
+    articles: ArticleList = query_latest_articles()
 
+    try:
+        SHARED_CACHE.put(SHARED_CACHE_KEY_LATEST_ARTICLES, articles.to_dict())
+    except Exception as error:
+        logger.exception(error)
+
+    return articles
+
+
+def query_latest_articles(
+        *,
+        limit: int = LATEST_ARTICLES_LIMIT,
+        cursor: Optional[str] = None,
+        summary: bool = False,
+        ) -> ArticleList:
+    '''Query a page of the most recent articles from the "latest" DynamoDB
+    index (or its summary counterpart), starting after the given cursor
+    '''
+    client = get_client('dynamodb')
+
+    query_args: Dict[str, Any] = {}
+
+    if cursor is not None:
+        query_args['ExclusiveStartKey'] = decode_cursor(cursor)
+
+    if summary:
+        query_args['IndexName'] = os.environ['DYNAMODB_SUMMARY_ARTICLES_INDEX']
+        query_args['ProjectionExpression'] = ', '.join(
+            f'#{i}' for i in range(len(SUMMARY_ATTRIBUTES)))
+        attr_names: Dict[str, str] = {
+            f'#{i}': name
+            for i, name in enumerate(SUMMARY_ATTRIBUTES)
+        }
     else:
-        client = boto3.client('dynamodb')
+        query_args['IndexName'] = os.environ['DYNAMODB_LATEST_ARTICLES_INDEX']
+        query_args['Select'] = 'ALL_ATTRIBUTES'
+        attr_names: Dict[str, str] = {}
 
-        response: dict = client.query(
-            TableName=os.environ['DYNAMODB_TABLE_NAME'],
-            IndexName=os.environ['DYNAMODB_LATEST_ARTICLES_INDEX'],
-            Select='ALL_ATTRIBUTES',
-            Limit=50,
-            ConsistentRead=False,
-            ScanIndexForward=False,  # Descending order
-            KeyConditionExpression='#partition_key = :article',
-            ExpressionAttributeNames={
-                '#partition_key': 'item-type',
-            },
-            ExpressionAttributeValues={
-                ':article': {
-                    'S': 'blog-article',
-                },
+    response: dict = client.query(
+        TableName=os.environ['DYNAMODB_TABLE_NAME'],
+        Limit=limit,
+        ConsistentRead=False,
+        ScanIndexForward=False,  # Descending order
+        KeyConditionExpression='#partition_key = :article',
+        ExpressionAttributeNames={
+            '#partition_key': 'item-type',
+            **attr_names,
+        },
+        ExpressionAttributeValues={
+            ':article': {
+                'S': 'blog-article',
             },
+        },
+        **query_args,
+    )
+
+    articles: List[Dict[str, Any]] = [
+        article_from_item(item, summary=summary)
+        for item in response['Items']
+    ]
+
+    add_sharded_likes(articles)
+
+    keys: List[Dict[str, Any]] = [
+        article_key(
+            article_id=item['id']['S'],
+            publish_timestamp=int(item['publish-timestamp']['N']),
         )
+        for item in response['Items']
+    ]
 
-        articles: List[Dict[str, Any]] = [
-            {
-                'id': item['id']['S'],
-                'publish-datetime': date_str(item['publish-timestamp']['N']),
-                'publisher-email': item['publisher-email']['S'],
-                'publisher-name': item['publisher-name']['S'],
-                'title': item['title']['S'],
-                'body': item['body']['S'],
-                'likes': int(item['likes']['N']),
-            }
-            for item in response['Items']
-        ]
+    next_cursor: Optional[str] = None
 
-        update_cache(articles=articles)
+    if 'LastEvaluatedKey' in response:
+        try:
+            next_cursor = encode_cursor(response['LastEvaluatedKey'])
+        except RuntimeError as error:
+            # Without a signing key, list the first page only rather than
+            # fail (and negatively cache) the whole listing
+            logger.error(error)
+
+    return ArticleList(
+        articles,
+        next_cursor=next_cursor,
+        summary=summary,
+        limit=limit,
+        keys=keys,
+    )
 
+
+def article_key(*, article_id: str, publish_timestamp: int) -> Dict[str, Any]:
+    '''Key of an article in the latest articles indexes, as found in the
+    LastEvaluatedKey of their queries
+    '''
     return {
-        'public_message': 'Articles retrieved',
-        'public_data': {
-            'articles': articles,
-        },
+        'id': {'S': article_id},
+        'item-type': {'S': 'blog-article'},
+        'publish-timestamp': {'N': str(publish_timestamp)},
     }
 
 
+def article_from_item(
+        item: Dict[str, dict],
+        *,
+        summary: bool = False,
+        ) -> Dict[str, Any]:
+    '''Convert a DynamoDB article item into its public representation
+    '''
+    article: Dict[str, Any] = {
+        'id': item['id']['S'],
+        'publish-datetime': date_str(item['publish-timestamp']['N']),
+        'publisher-email': item['publisher-email']['S'],
+        'publisher-name': item['publisher-name']['S'],
+        'title': item['title']['S'],
+        'likes': int(item['likes']['N']),
+    }
+
+    if summary:
+        article['excerpt'] = item.get('excerpt', {}).get('S', '')
+    else:
+        article['body'] = item['body']['S']
+
+    return article
+
+
 def date_str(timestamp: Union[str, int]) -> str:
     if type(timestamp) is str:
         timestamp = int(timestamp)
@@ -288,52 +658,261 @@ def date_str(timestamp: Union[str, int]) -> str:
     return date.strftime('%Y-%m-%d %H:%M (UTC)')
 
 
-def put_article(*, event: dict):
-    publish_timestamp: int = int(time.time())
+@ROUTER.route(
+    'get-article',
+    methods=['GET', 'POST'],
+    body={'article_ids': (list, type(None))},
+    body_error=ErrorMsg.UNAVAILABLE_ARTICLE_ID,
+)
+def get_article(*, request: RequestContext):
+    article_ids, many = requested_article_ids(request=request)
+    articles: Dict[str, Dict[str, Any]] = fetch_articles(
+        article_ids=article_ids)
+
+    if not many:
+        if article_ids[0] not in articles:
+            raise CustomException(
+                ErrorMsg.ARTICLE_DOES_NOT_EXIST, status_code=404)
+
+        return {
+            'public_message': 'Article retrieved',
+            'public_data': {
+                'article': articles[article_ids[0]],
+            },
+        }
+
+    return {
+        'public_message': 'Articles retrieved',
+        'public_data': {
+            'articles': [
+                articles[article_id]
+                for article_id in article_ids
+                if article_id in articles
+            ],
+            'missing_ids': [
+                article_id
+                for article_id in article_ids
+                if article_id not in articles
+            ],
+        },
+    }
+
+
+def requested_article_ids(
+        *,
+        request: RequestContext,
+        ) -> Tuple[List[str], bool]:
+    '''IDs requested in the "article_id" or "article_ids" (comma-separated)
+    query strings, or in the "article_ids" list of the request body; also
+    tells whether multiple articles were requested
+    '''
+    params: Dict[str, str] = request.params
+
+    if params.get('article_id'):
+        return [params['article_id']], False
 
     try:
-        article: Dict[str, str] = json.loads(event['body'])['article']
+        if 'article_ids' in params:
+            requested: List[str] = params['article_ids'].split(',')
+        else:
+            requested: List[str] = request.body['article_ids']
+
+        # Remove duplicates, keeping the requested order
+        article_ids: List[str] = list(dict.fromkeys(
+            str(article_id).strip()
+            for article_id in requested
+            if str(article_id).strip()
+        ))
+
     except Exception as error:
-        raise CustomException(ErrorMsg.UNAVAILABLE_ARTICLE_DATA) from error
+        raise CustomException(ErrorMsg.UNAVAILABLE_ARTICLE_ID) from error
 
-    article_id: str = hashlib.md5(
-        f'{article["title"]}{article["body"]}'.encode('utf-8')).hexdigest()
+    if not article_ids:
+        raise CustomException(ErrorMsg.UNAVAILABLE_ARTICLE_ID)
 
-    client = boto3.client('dynamodb')
+    if len(article_ids) > MAX_ARTICLES_PER_REQUEST:
+        raise CustomException(
+            ErrorMsg.TOO_MANY_ARTICLE_IDS.format(MAX_ARTICLES_PER_REQUEST))
 
-    try:
-        response: dict = client.put_item(
+    return article_ids, True
+
+
+def fetch_articles(*, article_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    '''Get full articles by ID from the per-article cache, fetching the
+    ones not cached from DynamoDB; IDs not found are left out
+    '''
+    articles: Dict[str, Dict[str, Any]] = {}
+    uncached_ids: List[str] = []
+
+    for article_id in article_ids:
+        cached: Any = ARTICLES_CACHE.get(article_id)
+
+        if cached is MISSING:
+            uncached_ids.append(article_id)
+        else:
+            articles[article_id] = cached
+
+    if len(uncached_ids) == 1:
+        response: dict = get_client('dynamodb').get_item(
             TableName=os.environ['DYNAMODB_TABLE_NAME'],
-            Item={
+            Key={
                 'id': {
-                    'S': article_id,
-                },
-                'publish-timestamp': {
-                    'N': str(publish_timestamp),
-                },
-                'publisher-email': {
-                    'S': article['publisher-email'],
-                },
-                'publisher-name': {
-                    'S': article['publisher-name'],
-                },
-                'item-type': {
-                    'S': 'blog-article',
-                },
-                'title': {
-                    'S': article['title'],
-                },
-                'body': {
-                    'S': article['body'],
-                },
-                'likes': {
-                    'N': str(0),
-                },
-                # The article will be auto-deleted by Dynamo after certain time
-                TIME_TO_LIVE_ATTR_NAME: {
-                    'N': str(publish_timestamp + TIME_TO_LIVE_DURATION),
+                    'S': uncached_ids[0],
                 },
             },
+        )
+        items: List[dict] = [response['Item']] if 'Item' in response else []
+
+    elif len(uncached_ids) > 1:
+        items: List[dict] = batch_get_items(keys=[
+            {'id': {'S': article_id}}
+            for article_id in uncached_ids
+        ])
+
+    else:
+        items: List[dict] = []
+
+    fetched: List[Dict[str, Any]] = [
+        article_from_item(item)
+        for item in items
+        if item.get('item-type', {}).get('S') == 'blog-article'
+    ]
+
+    add_sharded_likes(fetched)
+
+    for article in fetched:
+        articles[article['id']] = article
+
+        cache_article(article)
+
+    return articles
+
+
+def batch_get_items(*, keys: List[Dict[str, dict]]) -> List[dict]:
+    '''Get items with BatchGetItem, re-requesting UnprocessedKeys with
+    exponential backoff and full jitter
+    '''
+    client = get_client('dynamodb')
+    table_name: str = os.environ['DYNAMODB_TABLE_NAME']
+    items: List[dict] = []
+
+    for start in range(0, len(keys), DDB_BATCH_GET_QUOTA):
+        request_items: Dict[str, dict] = {
+            table_name: {
+                'Keys': keys[start:start + DDB_BATCH_GET_QUOTA],
+            },
+        }
+        attempt: int = 0
+
+        while request_items:
+            response: dict = client.batch_get_item(RequestItems=request_items)
+
+            items.extend(response.get('Responses', {}).get(table_name, []))
+
+            request_items = response.get('UnprocessedKeys') or {}
+            attempt += 1
+
+            if request_items and attempt >= DDB_BATCH_MAX_ATTEMPTS:
+                raise CustomException(
+                    ErrorMsg.ARTICLES_UNAVAILABLE, status_code=503)
+
+            if request_items:
+                time.sleep(random.uniform(0, min(2, 0.05 * 2 ** attempt)))
+
+    return items
+
+
+def cache_article(article: Dict[str, Any]) -> None:
+    # Approximate size, in characters, of the article contents
+    size: int = sum(len(str(value)) for value in article.values())
+
+    ARTICLES_CACHE.put(article['id'], article, size=size)
+
+
+@ROUTER.route('export-articles')
+def export_articles(*, request: RequestContext):
+    '''One page of a segment of the parallel articles export, as NDJSON
+
+    Clients scan every segment from 0 to total_segments - 1 (concurrently if
+    they wish), following the X-Next-Cursor header until it is missing.
+    '''
+    params: Dict[str, str] = request.params
+
+    try:
+        segment: int = int(params.get('segment', 0))
+        total_segments: int = int(
+            params.get('total_segments', EXPORT_TOTAL_SEGMENTS))
+
+        if not 0 <= segment < total_segments <= EXPORT_MAX_SEGMENTS:
+            raise ValueError(f'Invalid segment {segment}/{total_segments}')
+
+    except ValueError as error:
+        raise CustomException(
+            ErrorMsg.INVALID_SEGMENT.format(EXPORT_MAX_SEGMENTS)) from error
+
+    # Cursors hold the segment they continue, so that they can't be used to
+    # scan a segment from a key of another one
+    position: Dict[str, Any] = {
+        'segment': segment,
+        'total_segments': total_segments,
+    }
+    start_key: Optional[dict] = None
+
+    if params.get('cursor'):
+        cursor: dict = decode_cursor(params['cursor'])
+        start_key = cursor.get('key')
+
+        if type(start_key) is not dict or any(
+                cursor.get(name) != value for name, value in position.items()):
+            raise CustomException(ErrorMsg.INVALID_CURSOR)
+
+    items, last_key = scan_page(
+        table_name=os.environ['DYNAMODB_TABLE_NAME'],
+        segment=segment,
+        total_segments=total_segments,
+        start_key=start_key,
+    )
+
+    headers: Dict[str, str] = {
+        'Content-Type': 'application/x-ndjson',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor',
+    }
+
+    if last_key is not None:
+        headers['X-Next-Cursor'] = encode_cursor({**position, 'key': last_key})
+
+    return {
+        'public_message': 'Articles exported',
+        'raw_body': ''.join(to_ndjson(items)),
+        'headers': headers,
+    }
+
+
+@ROUTER.route(
+    'publish-article',
+    methods=['POST'],
+    body={'article': dict},
+    body_error=ErrorMsg.UNAVAILABLE_ARTICLE_DATA,
+)
+def put_article(*, request: RequestContext):
+    publish_timestamp: int = int(time.time())
+    article: Dict[str, str] = request.body['article']
+
+    if not is_valid_article(article):
+        raise CustomException(ErrorMsg.UNAVAILABLE_ARTICLE_DATA)
+
+    article_id: str = new_article_id(article)
+
+    client = get_client('dynamodb')
+
+    try:
+        response: dict = client.put_item(
+            TableName=os.environ['DYNAMODB_TABLE_NAME'],
+            Item=article_item(
+                article_id=article_id,
+                article=article,
+                publish_timestamp=publish_timestamp,
+            ),
             # Make sure we don't override a previously entered article
             ConditionExpression='attribute_not_exists(#id)',
             ExpressionAttributeNames={
@@ -347,79 +926,525 @@ def put_article(*, event: dict):
         else:
             raise err
 
-    print('DYNAMODB PUT ITEM RESPONSE:')
-    print(json.dumps(response))
+    LOG.debug('DynamoDB put item response', response=response)
 
     status: int = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
 
     public_message: str = 'Article published' if status == 200 else \
         'Error! Could not save the article'
 
+    published_article: Dict[str, Any] = public_article(
+        article_id=article_id,
+        article=article,
+        publish_timestamp=publish_timestamp,
+    )
+
+    if status == 200:
+        add_published_articles(
+            [published_article],
+            publish_timestamp=publish_timestamp,
+        )
+
     return {
         'status_code': status,
         'public_message': public_message,
         'public_data': {
-            'article': {
-                'id': article_id,
-                'publish-datetime': date_str(publish_timestamp),
-                'publisher-email': article['publisher-email'],
-                'publisher-name': article['publisher-name'],
-                'title': article['title'],
-                'body': article['body'],
-                'likes': 0,
-            },
+            'article': published_article,
         },
     }
 
 
-def like_article(*, event):
-    try:
-        article_id: Dict[str, str] = json.loads(event['body'])['article_id']
-    except Exception as error:
-        raise CustomException(ErrorMsg.UNAVAILABLE_ARTICLE_ID) from error
+@ROUTER.route(
+    'publish-articles',
+    methods=['POST'],
+    body={'articles': list},
+    body_error=ErrorMsg.UNAVAILABLE_ARTICLE_DATA,
+)
+def put_articles(*, request: RequestContext):
+    '''Publish many articles at once (e.g. imports), reporting the status of
+    each one in the order they were given
+    '''
+    publish_timestamp: int = int(time.time())
+    articles: List[Dict[str, str]] = request.body['articles']
+
+    if len(articles) > MAX_ARTICLES_PER_PUBLISH:
+        raise CustomException(
+            ErrorMsg.TOO_MANY_ARTICLES.format(MAX_ARTICLES_PER_PUBLISH))
+
+    statuses: List[Dict[str, Any]] = []
+    pending: Dict[str, Dict[str, str]] = {}
+
+    for article in articles:
+        if not is_valid_article(article):
+            statuses.append({'id': None, 'status': PUBLISH_STATUS_INVALID})
+            continue
 
-    client = boto3.client('dynamodb')
+        article_id: str = new_article_id(article)
 
+        if article_id in pending:
+            statuses.append({
+                'id': article_id,
+                'status': PUBLISH_STATUS_DUPLICATE,
+            })
+            continue
+
+        pending[article_id] = article
+        statuses.append({'id': article_id, 'status': None})
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=PUBLISH_MAX_WORKERS) as executor:
+        results: Dict[str, str] = dict(zip(
+            pending,
+            executor.map(
+                lambda item: publish_article_item(
+                    article_id=item[0],
+                    article=item[1],
+                    publish_timestamp=publish_timestamp,
+                ),
+                pending.items(),
+            ),
+        ))
+
+    for status in statuses:
+        if status['status'] is None:
+            status['status'] = results[status['id']]
+
+    add_published_articles([
+        public_article(
+            article_id=article_id,
+            article=pending[article_id],
+            publish_timestamp=publish_timestamp,
+        )
+        for article_id, result in results.items()
+        if result == PUBLISH_STATUS_PUBLISHED
+    ], publish_timestamp=publish_timestamp)
+
+    published_count: int = list(results.values()).count(
+        PUBLISH_STATUS_PUBLISHED)
+
+    return {
+        'public_message': f'{published_count} articles published',
+        'public_data': {
+            'articles': statuses,
+        },
+    }
+
+
+def publish_article_item(
+        *,
+        article_id: str,
+        article: Dict[str, str],
+        publish_timestamp: int,
+        ) -> str:
+    '''Conditionally put a single article item; returns its publish status
+    '''
     try:
-        response = client.update_item(
+        get_client('dynamodb').put_item(
             TableName=os.environ['DYNAMODB_TABLE_NAME'],
-            Key={
-                'id': {
-                    'S': article_id,
-                },
-            },
-            UpdateExpression='SET #likes = #likes + :incr',
-            ConditionExpression='attribute_exists(#likes)',
+            Item=article_item(
+                article_id=article_id,
+                article=article,
+                publish_timestamp=publish_timestamp,
+            ),
+            ConditionExpression='attribute_not_exists(#id)',
             ExpressionAttributeNames={
-                '#likes': 'likes',
-            },
-            ExpressionAttributeValues={
-                ':incr': {
-                    'N': '1',
-                },
+                '#id': 'id',
             },
-            ReturnValues='UPDATED_NEW',
         )
 
+    except botocore.exceptions.ClientError as err:
+        if err.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return PUBLISH_STATUS_EXISTS
+
+        logger.exception(err)
+
+        return PUBLISH_STATUS_FAILED
+
+    except Exception as error:
+        logger.exception(error)
+
+        return PUBLISH_STATUS_FAILED
+
+    return PUBLISH_STATUS_PUBLISHED
+
+
+def new_article_id(article: Dict[str, str]) -> str:
+    '''Articles are identified by their content, so that identical articles
+    are published only once
+    '''
+    return hashlib.md5(
+        f'{article["title"]}{article["body"]}'.encode('utf-8')).hexdigest()
+
+
+def is_valid_article(article: Any) -> bool:
+    return type(article) is dict and all(
+        type(article.get(field)) is str and article[field]
+        for field in ['publisher-email', 'publisher-name', 'title', 'body']
+    )
+
+
+def article_item(
+        *,
+        article_id: str,
+        article: Dict[str, str],
+        publish_timestamp: int,
+        ) -> Dict[str, Dict[str, str]]:
+    return {
+        'id': {
+            'S': article_id,
+        },
+        'publish-timestamp': {
+            'N': str(publish_timestamp),
+        },
+        'publisher-email': {
+            'S': article['publisher-email'],
+        },
+        'publisher-name': {
+            'S': article['publisher-name'],
+        },
+        'item-type': {
+            'S': 'blog-article',
+        },
+        'title': {
+            'S': article['title'],
+        },
+        'body': {
+            'S': article['body'],
+        },
+        'excerpt': {
+            'S': excerpt(article['body']),
+        },
+        'likes': {
+            'N': str(0),
+        },
+        # The article will be auto-deleted by Dynamo after certain time
+        TIME_TO_LIVE_ATTR_NAME: {
+            'N': str(publish_timestamp + TIME_TO_LIVE_DURATION),
+        },
+    }
+
+
+def public_article(
+        *,
+        article_id: str,
+        article: Dict[str, str],
+        publish_timestamp: int,
+        ) -> Dict[str, Any]:
+    return {
+        'id': article_id,
+        'publish-datetime': date_str(publish_timestamp),
+        'publisher-email': article['publisher-email'],
+        'publisher-name': article['publisher-name'],
+        'title': article['title'],
+        'body': article['body'],
+        'likes': 0,
+    }
+
+
+def add_published_articles(
+        articles: List[Dict[str, Any]],
+        *,
+        publish_timestamp: int,
+        ) -> None:
+    '''Write newly published articles through to the in-process caches and
+    drop the shared snapshot of latest articles
+
+    A single article is prepended to the cached first pages; after a bulk
+    publish, these pages are reloaded instead.
+    '''
+    if not articles:
+        return None
+
+    for article in articles:
+        cache_article(article)
+
+    if len(articles) == 1:
+        update_article_pages(
+            updater=lambda page: page.prepend(
+                articles[0],
+                key=article_key(
+                    article_id=articles[0]['id'],
+                    publish_timestamp=publish_timestamp,
+                ),
+            ),
+            first_pages_only=True,
+        )
+    else:
+        for cache in cached_article_pages(first_pages_only=True):
+            cache.invalidate()
+
+    try:
+        SHARED_CACHE.delete(SHARED_CACHE_KEY_LATEST_ARTICLES)
+    except Exception as error:
+        logger.exception(error)
+
+
+@ROUTER.route(
+    'like-article',
+    methods=['POST'],
+    # Optional token identifying a like across client retries
+    body={'article_id': str, 'request_token': (str, type(None))},
+    body_error=ErrorMsg.UNAVAILABLE_ARTICLE_ID,
+)
+def like_article(*, request: RequestContext):
+    article_id: str = request.body['article_id']
+    request_token: Optional[str] = request.body.get('request_token')
+
+    if request_token is not None and \
+            not LIKE_TOKEN_PATTERN.fullmatch(request_token):
+        raise CustomException(ErrorMsg.INVALID_REQUEST_TOKEN)
+
+    try:
+        if request_token is not None:
+            new_likes_count: Optional[int] = increment_likes_once(
+                article_id=article_id,
+                request_token=request_token,
+            )
+        elif LIKES_SHARD_COUNT > 0:
+            new_likes_count: Optional[int] = increment_sharded_likes(
+                article_id=article_id)
+        else:
+            new_likes_count: Optional[int] = increment_likes(
+                article_id=article_id)
+
+    except CustomException:
+        raise
+
+    except Exception as error:
+        logger.exception(error)
+
         return {
-            'public_message': 'Article liked',
+            'public_message': 'Sorry, the like could not be processed',
+        }
+
+    if new_likes_count is None:
+        return {
+            'public_message': 'Article already liked',
             'public_data': {
-                'new_likes_count': int(response['Attributes']['likes']['N']),
+                'new_likes_count': estimated_likes(article_id=article_id),
             },
         }
 
+    update_article_pages(
+        updater=lambda articles: articles.update_likes(
+            article_id, new_likes_count))
+    ARTICLES_CACHE.update(
+        article_id,
+        updater=lambda article: {**article, 'likes': new_likes_count},
+    )
+
+    return {
+        'public_message': 'Article liked',
+        'public_data': {
+            'new_likes_count': new_likes_count,
+        },
+    }
+
+
+def increment_likes_once(
+        *,
+        article_id: str,
+        request_token: str,
+        ) -> Optional[int]:
+    '''Record the token of a like request and count the like in a single
+    transaction; returns None if the token was already seen, meaning the
+    request is a retry of a previous like
+
+    Returns the estimated likes count of the article, as transactions do not
+    return updated values.
+    '''
+    if LIKE_TOKENS_CACHE.get(request_token) is not MISSING:
+        return None
+
+    likes: int = estimated_likes(article_id=article_id)
+
+    if LIKES_SHARD_COUNT > 0:
+        likes_update: Dict[str, Any] = sharded_likes_update(article_id, 1)
+    else:
+        likes_update: Dict[str, Any] = article_likes_update(article_id)
+
+    timestamp: int = int(time.time())
+
+    try:
+        get_client('dynamodb').transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': os.environ['DYNAMODB_TABLE_NAME'],
+                    'Item': {
+                        'id': {
+                            'S': f'{LIKE_TOKEN_ID_PREFIX}{request_token}',
+                        },
+                        'item-type': {
+                            'S': LIKE_TOKEN_ITEM_TYPE,
+                        },
+                        TIME_TO_LIVE_ATTR_NAME: {
+                            'N': str(timestamp + LIKE_TOKEN_TTL),
+                        },
+                    },
+                    'ConditionExpression': 'attribute_not_exists(#id)',
+                    'ExpressionAttributeNames': {
+                        '#id': 'id',
+                    },
+                },
+            },
+            {
+                'Update': likes_update,
+            },
+        ])
+
+    except botocore.exceptions.ClientError as err:
+        if err.response['Error']['Code'] != 'TransactionCanceledException':
+            raise err
+
+        # One reason per transaction item, in the same order
+        token_reason, likes_reason = [
+            reason.get('Code')
+            for reason in err.response.get('CancellationReasons', [{}, {}])
+        ]
+
+        if token_reason == 'ConditionalCheckFailed':
+            # Token claimed by a request served by another container
+            LIKE_TOKENS_CACHE.put(request_token, timestamp, size=1)
+
+            return None
+
+        if likes_reason == 'ConditionalCheckFailed':
+            raise CustomException(ErrorMsg.ARTICLE_DOES_NOT_EXIST) from err
+
+        raise err
+
+    LIKE_TOKENS_CACHE.put(request_token, timestamp, size=1)
+
+    return likes + 1
+
+
+def increment_likes(*, article_id: str) -> int:
+    '''Increment the likes count stored in the article item itself
+    '''
+    try:
+        response = get_client('dynamodb').update_item(
+            **article_likes_update(article_id),
+            ReturnValues='UPDATED_NEW',
+        )
+
     except botocore.exceptions.ClientError as err:
         if err.response['Error']['Code'] == 'ConditionalCheckFailedException':
             raise CustomException(ErrorMsg.ARTICLE_DOES_NOT_EXIST) from err
         else:
             raise err
 
-    except Exception as error:
-        logger.exception(error)
+    return int(response['Attributes']['likes']['N'])
 
-        return {
-            'public_message': 'Sorry, the like could not be processed',
-        }
+
+def article_likes_update(article_id: str) -> Dict[str, Any]:
+    return {
+        'TableName': os.environ['DYNAMODB_TABLE_NAME'],
+        'Key': {
+            'id': {
+                'S': article_id,
+            },
+        },
+        'UpdateExpression': 'SET #likes = #likes + :incr',
+        'ConditionExpression': 'attribute_exists(#likes)',
+        'ExpressionAttributeNames': {
+            '#likes': 'likes',
+        },
+        'ExpressionAttributeValues': {
+            ':incr': {
+                'N': '1',
+            },
+        },
+    }
+
+
+def increment_sharded_likes(*, article_id: str) -> int:
+    '''Count a like in a randomly chosen shard of the article likes counter;
+    returns the estimated likes count of the article
+    '''
+    likes: int = estimated_likes(article_id=article_id)
+
+    write_sharded_likes(article_id, 1)
+
+    return likes + 1
+
+
+def estimated_likes(*, article_id: str) -> int:
+    '''Likes count of an article as currently known by this container
+    '''
+    articles: Dict[str, Dict[str, Any]] = fetch_articles(
+        article_ids=[article_id])
+
+    if article_id not in articles:
+        raise CustomException(ErrorMsg.ARTICLE_DOES_NOT_EXIST)
+
+    return articles[article_id]['likes']
+
+
+def write_sharded_likes(article_id: str, count: int) -> None:
+    get_client('dynamodb').update_item(
+        **sharded_likes_update(article_id, count))
+
+
+def sharded_likes_update(article_id: str, count: int) -> Dict[str, Any]:
+    shard: int = random.randrange(LIKES_SHARD_COUNT)
+
+    return {
+        'TableName': os.environ['DYNAMODB_TABLE_NAME'],
+        'Key': {
+            'id': {
+                'S': likes_shard_id(article_id, shard),
+            },
+        },
+        'UpdateExpression': 'ADD #likes :incr '
+                            'SET #item_type = :item_type, '
+                            '#article_id = :article_id, '
+                            '#ttl = :ttl',
+        'ExpressionAttributeNames': {
+            '#likes': 'likes',
+            '#item_type': 'item-type',
+            '#article_id': 'article-id',
+            '#ttl': TIME_TO_LIVE_ATTR_NAME,
+        },
+        'ExpressionAttributeValues': {
+            ':incr': {
+                'N': str(count),
+            },
+            ':item_type': {
+                'S': LIKES_SHARD_ITEM_TYPE,
+            },
+            ':article_id': {
+                'S': article_id,
+            },
+            ':ttl': {
+                'N': str(int(time.time()) + TIME_TO_LIVE_DURATION),
+            },
+        },
+    }
+
+
+def likes_shard_id(article_id: str, shard: int) -> str:
+    return f'{article_id}#likes-{shard}'
+
+
+def add_sharded_likes(articles: List[Dict[str, Any]]) -> None:
+    '''Add the likes counted in counter shards to the articles, in place
+    '''
+    if LIKES_SHARD_COUNT <= 0 or not articles:
+        return None
+
+    items: List[dict] = batch_get_items(keys=[
+        {'id': {'S': likes_shard_id(article['id'], shard)}}
+        for article in articles
+        for shard in range(LIKES_SHARD_COUNT)
+    ])
+
+    shard_likes: Dict[str, int] = collections.defaultdict(int)
+
+    for item in items:
+        shard_likes[item['article-id']['S']] += int(item['likes']['N'])
+
+    for article in articles:
+        article['likes'] += shard_likes[article['id']]
 
 
 if __name__ == '__main__':
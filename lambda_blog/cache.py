@@ -0,0 +1,271 @@
+#! /usr/bin/python3.8 Python3.8
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger()
+
+# Returned by SwrCache.peek and LruCache.get when nothing is cached, since
+# an empty list (or any falsy value) is a legitimate cached value
+MISSING: Any = object()
+
+
+class SwrCache:
+    '''In-process cache holding a single value with stale-while-revalidate
+
+    Values younger than soft_ttl are served as hits. Between soft_ttl and
+    hard_ttl the stale value is served right away while one background
+    thread reloads it. Past hard_ttl (or before the first load) the caller
+    loads the value; concurrent misses wait for a single in-flight load.
+
+    Load failures are negatively cached: for negative_ttl seconds after a
+    failed load, misses re-raise the same error instead of calling loader.
+    '''
+
+    def __init__(
+            self,
+            *,
+            soft_ttl: float,
+            hard_ttl: float,
+            negative_ttl: float = 0,
+            ) -> None:
+        if hard_ttl < soft_ttl:
+            raise ValueError('Cache hard_ttl must not be lower than soft_ttl')
+
+        self.soft_ttl: float = soft_ttl
+        self.hard_ttl: float = hard_ttl
+        self.negative_ttl: float = negative_ttl
+
+        self.stats: Dict[str, int] = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'negative_hits': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+        }
+
+        self._value: Any = None
+        self._stored_at: Optional[float] = None  # None when nothing cached
+        self._error: Optional[Exception] = None
+        self._error_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._loading: Optional[threading.Event] = None
+        self._refreshing: bool = False
+
+    def get(self, *, loader: Callable[[], Any]) -> Any:
+        '''Return the cached value, calling loader when it is missing/expired
+        '''
+        with self._lock:
+            age: Optional[float] = self._age()
+
+            if age is not None and age < self.soft_ttl:
+                self.stats['hits'] += 1
+                return self._value
+
+            if age is not None and age < self.hard_ttl:
+                self.stats['stale'] += 1
+
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh,
+                        kwargs={'loader': loader},
+                        name='cache-refresh',
+                        daemon=True,
+                    ).start()
+
+                return self._value
+
+            if self._error is not None and \
+                    time.monotonic() - self._error_at < self.negative_ttl:
+                self.stats['negative_hits'] += 1
+                raise self._error
+
+            self.stats['misses'] += 1
+
+            loading: Optional[threading.Event] = self._loading
+            is_leader: bool = loading is None
+
+            if is_leader:
+                loading = self._loading = threading.Event()
+
+        if not is_leader:
+            loading.wait()
+
+            with self._lock:
+                if self._age() is not None and self._age() < self.hard_ttl:
+                    return self._value
+
+                if self._error is not None and self.negative_ttl > 0:
+                    raise self._error
+
+            # The leader failed to load, try it on our own
+            return self.set(value=loader())
+
+        try:
+            return self.set(value=loader())
+
+        except Exception as error:
+            with self._lock:
+                self._error = error
+                self._error_at = time.monotonic()
+
+            raise
+
+        finally:
+            with self._lock:
+                self._loading = None
+
+            loading.set()
+
+    def set(self, *, value: Any) -> Any:
+        '''Store a fresh value in the cache
+        '''
+        with self._lock:
+            self._value = value
+            self._stored_at = time.monotonic()
+            self._error = None
+            self._error_at = None
+
+        return value
+
+    def update(self, *, updater: Callable[[Any], Any]) -> bool:
+        '''Apply updater to the cached value in place (write-through), keeping
+        its age; returns False if nothing is cached
+        '''
+        with self._lock:
+            if self._stored_at is None:
+                return False
+
+            updater(self._value)
+
+        return True
+
+    def peek(self) -> Any:
+        '''Return the cached value regardless of its age, or MISSING
+        '''
+        with self._lock:
+            return MISSING if self._stored_at is None else self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+            self._stored_at = None
+            self._error = None
+            self._error_at = None
+
+    def _age(self) -> Optional[float]:
+        if self._stored_at is None:
+            return None
+
+        return time.monotonic() - self._stored_at
+
+    def _refresh(self, *, loader: Callable[[], Any]) -> None:
+        try:
+            self.set(value=loader())
+            self.stats['refreshes'] += 1
+
+        except Exception as error:
+            logger.exception(error)
+            self.stats['refresh_errors'] += 1
+
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+class LruCache:
+    '''Bounded, size-aware least-recently-used cache with a time-to-live
+
+    Entries are evicted (oldest use first) whenever either max_items or
+    max_size (sum of the sizes given on put) is exceeded.
+    '''
+
+    def __init__(self, *, max_items: int, max_size: int, ttl: float) -> None:
+        self.max_items: int = max_items
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+
+        self.stats: Dict[str, int] = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+        }
+
+        # Key -> (value, size, stored_at)
+        self._entries: 'collections.OrderedDict[str, Tuple[Any, int, float]]' \
+            = collections.OrderedDict()
+        self._size: int = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Any:
+        '''Return the cached value for key, or MISSING
+        '''
+        with self._lock:
+            entry: Optional[Tuple[Any, int, float]] = self._entries.get(key)
+
+            if entry is None:
+                self.stats['misses'] += 1
+                return MISSING
+
+            if time.monotonic() - entry[2] >= self.ttl:
+                self._remove(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+
+            return entry[0]
+
+    def put(self, key: str, value: Any, *, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if size > self.max_size:
+                return None
+
+            self._entries[key] = (value, size, time.monotonic())
+            self._size += size
+
+            while len(self._entries) > self.max_items or \
+                    self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def update(self, key: str, *, updater: Callable[[Any], Any]) -> bool:
+        '''Replace a cached value with updater(value), keeping its age and
+        size; returns False if key is not cached
+        '''
+        with self._lock:
+            entry: Optional[Tuple[Any, int, float]] = self._entries.get(key)
+
+            if entry is None:
+                return False
+
+            self._entries[key] = (updater(entry[0]), entry[1], entry[2])
+
+        return True
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
@@ -0,0 +1,163 @@
+#! /usr/bin/python3.8 Python3.8
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any, Optional
+
+from aws_clients import get_client
+
+
+logger = logging.getLogger()
+
+# Snapshot items share the blog table; lambda_streams deletes them by ID
+SNAPSHOT_ID_PREFIX: str = 'cache-snapshot#'
+SNAPSHOT_ITEM_TYPE: str = 'cache-snapshot'
+
+
+def encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value).encode('utf-8'))
+
+
+def decode(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+class NullBackend:
+    '''Shared cache backend that never holds anything
+    '''
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        return None
+
+    def delete(self, key: str) -> None:
+        return None
+
+
+class DynamoDBSnapshotBackend:
+    '''Keeps cached values as compressed "snapshot" items in the blog table,
+    shared by all containers of the function
+    '''
+
+    def __init__(
+            self,
+            *,
+            table_name: str,
+            ttl: int,
+            ttl_attr_name: str,
+            ) -> None:
+        self.table_name: str = table_name
+        self.ttl: int = ttl
+        self.ttl_attr_name: str = ttl_attr_name
+
+    def get(self, key: str) -> Optional[Any]:
+        response: dict = get_client('dynamodb').get_item(
+            TableName=self.table_name,
+            Key={
+                'id': {
+                    'S': f'{SNAPSHOT_ID_PREFIX}{key}',
+                },
+            },
+            ProjectionExpression='#payload, #expires',
+            ExpressionAttributeNames={
+                '#payload': 'payload',
+                '#expires': 'expires-at',
+            },
+        )
+
+        item: Optional[dict] = response.get('Item')
+
+        # DynamoDB TTL deletion is lazy, expiration is enforced here
+        if item is None or int(item['expires-at']['N']) <= time.time():
+            return None
+
+        return decode(item['payload']['B'])
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at: int = int(time.time()) + self.ttl
+
+        get_client('dynamodb').put_item(
+            TableName=self.table_name,
+            Item={
+                'id': {
+                    'S': f'{SNAPSHOT_ID_PREFIX}{key}',
+                },
+                'item-type': {
+                    'S': SNAPSHOT_ITEM_TYPE,
+                },
+                'payload': {
+                    'B': encode(value),
+                },
+                'expires-at': {
+                    'N': str(expires_at),
+                },
+                self.ttl_attr_name: {
+                    'N': str(expires_at),
+                },
+            },
+        )
+
+    def delete(self, key: str) -> None:
+        get_client('dynamodb').delete_item(
+            TableName=self.table_name,
+            Key={
+                'id': {
+                    'S': f'{SNAPSHOT_ID_PREFIX}{key}',
+                },
+            },
+        )
+
+
+class RedisBackend:
+    '''Keeps cached values in a Redis-compatible server; any client exposing
+    get/set/delete (e.g. a fake in tests) can be given instead of a URL
+    '''
+
+    def __init__(
+            self,
+            *,
+            ttl: int,
+            url: Optional[str] = None,
+            client: Optional[Any] = None,
+            ) -> None:
+        if client is None:
+            import redis  # Optional dependency, only needed for this backend
+
+            client = redis.Redis.from_url(url)
+
+        self.ttl: int = ttl
+        self.client: Any = client
+
+    def get(self, key: str) -> Optional[Any]:
+        payload: Optional[bytes] = self.client.get(key)
+
+        return None if payload is None else decode(payload)
+
+    def put(self, key: str, value: Any) -> None:
+        self.client.set(key, encode(value), ex=self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+def backend_from_env() -> Any:
+    '''Build the shared cache backend named in SHARED_CACHE_BACKEND
+    '''
+    backend: str = os.environ.get('SHARED_CACHE_BACKEND', 'none')
+    ttl: int = int(os.environ.get('SHARED_CACHE_TTL', 60))
+
+    if backend == 'dynamodb':
+        return DynamoDBSnapshotBackend(
+            table_name=os.environ['DYNAMODB_TABLE_NAME'],
+            ttl=ttl,
+            ttl_attr_name=os.environ['DYNAMODB_TTL_ATTR_NAME'],
+        )
+
+    if backend == 'redis':
+        return RedisBackend(ttl=ttl, url=os.environ['REDIS_URL'])
+
+    return NullBackend()
@@ -0,0 +1,55 @@
+#! /usr/bin/python3.8 Python3.8
+import collections
+
+import pytest
+
+
+@pytest.fixture(scope='function', autouse=True)
+def load_environment_vars(monkeypatch):
+    monkeypatch.setenv('CURSOR_SIGNING_KEY', 'dummy-signing-key')
+
+
+@pytest.fixture(scope='function', autouse=True)
+def empty_caches(monkeypatch):
+    '''Give each test empty in-process caches; the module caches are put
+    back untouched on teardown, so nothing cached leaks between tests
+    '''
+    import blog
+
+    monkeypatch.setattr(blog, 'LATEST_ARTICLES_CACHE', blog.SwrCache(
+        soft_ttl=blog.MAX_CACHE_AGE,
+        hard_ttl=blog.MAX_CACHE_STALE_AGE,
+        negative_ttl=blog.MAX_CACHE_ERROR_AGE,
+    ))
+    monkeypatch.setattr(
+        blog, 'ARTICLE_PAGES_CACHE', collections.OrderedDict())
+    monkeypatch.setattr(
+        blog,
+        'ARTICLES_CACHE',
+        blog.LruCache(max_items=10, max_size=1000, ttl=60),
+    )
+    monkeypatch.setattr(
+        blog,
+        'LIKE_TOKENS_CACHE',
+        blog.LruCache(max_items=10, max_size=10, ttl=60),
+    )
+
+
+@pytest.fixture()
+def article_item():
+    '''Build the DynamoDB item of an article, with attributes overridden
+    '''
+    def build(article_id='abc', **attributes):
+        return {
+            'id': {'S': article_id},
+            'item-type': {'S': 'blog-article'},
+            'publish-timestamp': {'N': '1594596504'},
+            'publisher-email': {'S': 'john@example.com'},
+            'publisher-name': {'S': 'John'},
+            'title': {'S': 'Hello'},
+            'body': {'S': 'Lorem ipsum'},
+            'likes': {'N': '0'},
+            **attributes,
+        }
+
+    return build
@@ -0,0 +1,76 @@
+#! /usr/bin/python3.8 Python3.8
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import os
+
+from aws_clients import get_client
+from error_handling import CustomException, ErrorMsg
+
+
+def signing_key() -> bytes:
+    '''Key of the cursor signatures: CURSOR_SIGNING_KEY, else the Secrets
+    Manager secret CURSOR_SIGNING_KEY_SECRET_ARN; without either, raises
+    RuntimeError rather than sign with a guessable key
+
+    Listings then omit their next cursor, while exports, which cannot
+    continue without one, fail.
+    '''
+    key: str = os.environ.get('CURSOR_SIGNING_KEY', '')
+
+    if key:
+        return key.encode('utf-8')
+
+    secret_arn: str = os.environ.get('CURSOR_SIGNING_KEY_SECRET_ARN', '')
+
+    if not secret_arn:
+        raise RuntimeError(ErrorMsg.MISSING_CURSOR_SIGNING_KEY)
+
+    return secret_signing_key(secret_arn)
+
+
+@functools.lru_cache(maxsize=None)
+def secret_signing_key(secret_arn: str) -> bytes:
+    '''Read once per container (failed reads are not cached)
+    '''
+    response: dict = get_client('secretsmanager').get_secret_value(
+        SecretId=secret_arn)
+
+    return response['SecretString'].encode('utf-8')
+
+
+def encode_cursor(key: dict) -> str:
+    '''Encode a DynamoDB LastEvaluatedKey (or a dict holding one) as an
+    opaque, signed cursor
+    '''
+    payload: bytes = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    signature: bytes = hmac.new(
+        signing_key(), payload, hashlib.sha256).digest()
+
+    return base64.urlsafe_b64encode(signature + payload).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> dict:
+    '''Decode a cursor created by encode_cursor, rejecting tampered ones
+    '''
+    try:
+        secret: bytes = signing_key()
+        raw: bytes = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        signature, payload = raw[:32], raw[32:]
+
+        expected: bytes = hmac.new(secret, payload, hashlib.sha256).digest()
+
+        if not hmac.compare_digest(signature, expected):
+            raise ValueError('Cursor signature mismatch')
+
+        key: dict = json.loads(payload.decode('utf-8'))
+
+        if type(key) is not dict:
+            raise ValueError('Cursor is not a JSON object')
+
+    except Exception as error:
+        raise CustomException(ErrorMsg.INVALID_CURSOR) from error
+
+    return key
@@ -16,6 +16,12 @@ class ErrorMsg:
 
     INVALID_ACTION = "Unrecognized action '{}'"
 
+    METHOD_NOT_ALLOWED = "HTTP method {} is not allowed for action '{}'"
+
+    MISSING_PARAM = 'Missing query string "{}"'
+
+    INVALID_BODY = 'Invalid request body'
+
     ARTICLE_ALREADY_EXISTS = 'Another identical article is already published'
 
     ARTICLE_DOES_NOT_EXIST = 'Article not found'
@@ -24,6 +30,27 @@ class ErrorMsg:
 
     UNAVAILABLE_ARTICLE_ID = 'Article ID is unavailable in the request'
 
+    INVALID_REQUEST_TOKEN = \
+        'Request token must have 8 to 128 letters, digits, "-" or "_"'
+
+    TOO_MANY_ARTICLE_IDS = 'Up to {} article IDs can be requested at once'
+
+    TOO_MANY_ARTICLES = 'Up to {} articles can be published at once'
+
+    ARTICLES_UNAVAILABLE = 'Articles are temporarily unavailable'
+
+    INVALID_CURSOR = 'Invalid pagination cursor'
+
+    MISSING_CURSOR_SIGNING_KEY = 'Set CURSOR_SIGNING_KEY or ' \
+        'CURSOR_SIGNING_KEY_SECRET_ARN to sign pagination cursors'
+
+    INVALID_LIMIT = 'Query string "limit" must be an integer from 1 to {}'
+
+    INVALID_SEGMENT = 'Query strings "segment" and "total_segments" must ' \
+        'be integers, with 0 <= segment < total_segments <= {}'
+
+    INVALID_FIELDS = "Unrecognized fields '{}', use 'full' or 'summary'"
+
 
 class CustomException(Exception):
 
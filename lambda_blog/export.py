@@ -0,0 +1,223 @@
+#! /usr/bin/python3.8 Python3.8
+'''Export of all blog articles as NDJSON (one JSON article item per line)
+
+Articles are read with a parallel Scan: the table is split in segments that
+are scanned concurrently, and pages of items flow through a bounded queue to
+a chain of generators, so that memory use doesn't grow with the table size.
+
+Usage: python export.py [--table TABLE] [--segments N] > articles.ndjson
+'''
+import argparse
+import concurrent.futures
+import decimal
+import json
+import os
+import queue
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from aws_clients import get_client
+
+
+ARTICLE_ITEM_TYPE: str = 'blog-article'
+EXPORT_TOTAL_SEGMENTS: int = int(os.environ.get('EXPORT_TOTAL_SEGMENTS', 4))
+EXPORT_MAX_SEGMENTS: int = 64
+EXPORT_SCAN_PAGE_SIZE: int = int(os.environ.get('EXPORT_SCAN_PAGE_SIZE', 500))
+MAX_BUFFERED_PAGES: int = 8
+
+_deserializer = TypeDeserializer()
+
+
+def scan_page(
+        *,
+        table_name: str,
+        segment: int,
+        total_segments: int,
+        start_key: Optional[dict] = None,
+        limit: int = EXPORT_SCAN_PAGE_SIZE,
+        ) -> Tuple[List[dict], Optional[dict]]:
+    '''Scan one page of article items in a segment; returns the items and
+    the key to continue from (None once the segment is exhausted)
+    '''
+    params: Dict[str, Any] = {
+        'TableName': table_name,
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'Limit': limit,
+        'FilterExpression': '#item_type = :item_type',
+        'ExpressionAttributeNames': {
+            '#item_type': 'item-type',
+        },
+        'ExpressionAttributeValues': {
+            ':item_type': {
+                'S': ARTICLE_ITEM_TYPE,
+            },
+        },
+    }
+
+    if start_key is not None:
+        params['ExclusiveStartKey'] = start_key
+
+    response: dict = get_client('dynamodb').scan(**params)
+
+    return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+def scan_segment(
+        *,
+        table_name: str,
+        segment: int,
+        total_segments: int,
+        ) -> Iterator[List[dict]]:
+    '''Yield the (non-empty) pages of article items of a segment
+    '''
+    start_key: Optional[dict] = None
+
+    while True:
+        items, start_key = scan_page(
+            table_name=table_name,
+            segment=segment,
+            total_segments=total_segments,
+            start_key=start_key,
+        )
+
+        if items:
+            yield items
+
+        if start_key is None:
+            return None
+
+
+def parallel_scan(
+        *,
+        table_name: str,
+        total_segments: int = EXPORT_TOTAL_SEGMENTS,
+        max_buffered_pages: int = MAX_BUFFERED_PAGES,
+        ) -> Iterator[dict]:
+    '''Yield article items of all segments, scanned concurrently
+
+    Scanning threads block once max_buffered_pages pages are waiting to be
+    consumed, and stop if the consumer stops iterating.
+    '''
+    pages: queue.Queue = queue.Queue(maxsize=max_buffered_pages)
+    segment_done: Any = object()
+    stopped = threading.Event()
+
+    def enqueue(page: Any) -> None:
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return None
+            except queue.Full:
+                continue
+
+    def scan(segment: int) -> None:
+        try:
+            for page in scan_segment(
+                    table_name=table_name,
+                    segment=segment,
+                    total_segments=total_segments,
+                    ):
+                if stopped.is_set():
+                    return None
+
+                enqueue(page)
+
+        except Exception as error:
+            enqueue(error)
+
+        finally:
+            enqueue(segment_done)
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=total_segments) as executor:
+        for segment in range(total_segments):
+            executor.submit(scan, segment)
+
+        try:
+            remaining: int = total_segments
+
+            while remaining:
+                page: Any = pages.get()
+
+                if page is segment_done:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+
+        finally:
+            stopped.set()
+
+
+def plain_item(item: Dict[str, dict]) -> Dict[str, Any]:
+    '''Convert a DynamoDB item (typed attribute values) into plain values
+    '''
+    return {
+        name: _deserializer.deserialize(value)
+        for name, value in item.items()
+    }
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() \
+            else float(value)
+
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+
+    raise TypeError(f'Cannot serialize {type(value).__name__} to JSON')
+
+
+def to_ndjson(items: Iterable[Dict[str, dict]]) -> Iterator[str]:
+    '''Serialize DynamoDB items as NDJSON lines
+    '''
+    for item in items:
+        yield json.dumps(
+            plain_item(item),
+            default=json_default,
+            separators=(',', ':'),
+        ) + '\n'
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Export all blog articles as NDJSON')
+    parser.add_argument(
+        '--table',
+        default=os.environ.get('DYNAMODB_TABLE_NAME'),
+        help='DynamoDB table name (default: $DYNAMODB_TABLE_NAME)',
+    )
+    parser.add_argument(
+        '--segments',
+        type=int,
+        default=EXPORT_TOTAL_SEGMENTS,
+        help='Number of segments scanned in parallel',
+    )
+    parser.add_argument(
+        '--output',
+        type=argparse.FileType('w'),
+        default=sys.stdout,
+        help='Output file (default: stdout)',
+    )
+    args = parser.parse_args(argv)
+
+    if not args.table:
+        parser.error('a table name is required')
+
+    if not 1 <= args.segments <= EXPORT_MAX_SEGMENTS:
+        parser.error(f'segments must be from 1 to {EXPORT_MAX_SEGMENTS}')
+
+    args.output.writelines(to_ndjson(parallel_scan(
+        table_name=args.table,
+        total_segments=args.segments,
+    )))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#! /usr/bin/python3.8 Python3.8
+import json
+from typing import Any, Dict, Optional
+
+
+# Marks attributes not parsed yet, since None is a legitimate parsed value
+_UNPARSED: Any = object()
+
+# CloudFront viewer headers, checked in order, and the device types they mean
+DEVICE_HEADERS: Dict[str, str] = {
+    'cloudfront-is-desktop-viewer': 'Desktop',
+    'cloudfront-is-mobile-viewer': 'Mobile',
+    'cloudfront-is-smarttv-viewer': 'SmartTV',
+    'cloudfront-is-tablet-viewer': 'Tablet',
+}
+
+
+class RequestContext:
+    '''API Gateway proxy event wrapper, parsing each part of the request on
+    first use and only once per invocation
+
+    The same context is shared by request logging and the action, so that
+    large bodies (e.g. published articles) are decoded a single time.
+    '''
+
+    __slots__ = (
+        'event',
+        '_body',
+        '_params',
+        '_headers',
+        '_device_type',
+        '_country',
+    )
+
+    def __init__(self, event: dict) -> None:
+        self.event: dict = event
+        self._body: Any = _UNPARSED
+        self._params: Optional[Dict[str, str]] = None
+        self._headers: Optional[Dict[str, str]] = None
+        self._device_type: Optional[str] = None
+        self._country: Any = _UNPARSED
+
+    @property
+    def body(self) -> Any:
+        '''Decoded JSON body; None if missing or not valid JSON
+        '''
+        if self._body is _UNPARSED:
+            try:
+                self._body = json.loads(self.event.get('body') or 'null')
+            except ValueError:
+                self._body = None
+
+        return self._body
+
+    @body.setter
+    def body(self, body: Any) -> None:
+        '''Replace the body with its validated form
+        '''
+        self._body = body
+
+    @property
+    def params(self) -> Dict[str, str]:
+        if self._params is None:
+            self._params = self.event.get('queryStringParameters') or {}
+
+        return self._params
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        '''Request headers, with lowercase names
+        '''
+        if self._headers is None:
+            self._headers = {
+                name.lower(): value
+                for name, value in (self.event.get('headers') or {}).items()
+            }
+
+        return self._headers
+
+    @property
+    def method(self) -> Optional[str]:
+        return self.event.get('httpMethod')
+
+    @property
+    def action(self) -> Optional[str]:
+        return self.params.get('action')
+
+    @property
+    def device_type(self) -> str:
+        if self._device_type is None:
+            self._device_type = next(
+                (
+                    device_type
+                    for header, device_type in DEVICE_HEADERS.items()
+                    if self.headers.get(header) in [True, 'true']
+                ),
+                'Unknown',
+            )
+
+        return self._device_type
+
+    @property
+    def country(self) -> Optional[str]:
+        if self._country is _UNPARSED:
+            country: Any = self.headers.get('cloudfront-viewer-country')
+            self._country = country if type(country) is str else None
+
+        return self._country
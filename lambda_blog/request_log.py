@@ -0,0 +1,193 @@
+#! /usr/bin/python3.8 Python3.8
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aws_clients import get_client
+
+
+logger = logging.getLogger()
+
+DDB_BATCH_WRITE_QUOTA: int = 25  # Max items per BatchWriteItem call
+
+OVERFLOW_DROP_NEWEST: str = 'drop-newest'
+OVERFLOW_DROP_OLDEST: str = 'drop-oldest'
+
+
+class RequestLogBuffer:
+    '''Bounded in-memory buffer of API request items written to DynamoDB by
+    a background thread, so that logging never blocks the API response
+
+    Items are coalesced across invocations of a warm container and flushed
+    with BatchWriteItem once a full batch is buffered or the oldest item
+    reaches max_age seconds. The writer can't run while the container is
+    frozen between invocations, and Lambda reaps idle containers without a
+    SIGTERM unless an extension is registered: items still buffered when an
+    invocation returns may be lost (len() tells how many).
+    '''
+
+    def __init__(
+            self,
+            *,
+            max_size: int = 1000,
+            overflow_policy: str = OVERFLOW_DROP_OLDEST,
+            max_age: float = 10,
+            max_attempts: int = 5,
+            backoff_base: float = 0.05,
+            backoff_cap: float = 2,
+            table_name: Optional[str] = None,
+            ) -> None:
+        if overflow_policy not in [OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST]:
+            raise ValueError(f'Invalid overflow policy: {overflow_policy}')
+
+        self.max_size: int = max_size
+        self.overflow_policy: str = overflow_policy
+        self.max_age: float = max_age
+        self.max_attempts: int = max_attempts
+        self.backoff_base: float = backoff_base
+        self.backoff_cap: float = backoff_cap
+        self.table_name: Optional[str] = table_name
+
+        self.stats: Dict[str, int] = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'retries': 0,
+        }
+
+        # Items are kept along with the time they were enqueued
+        self._items: Deque[Tuple[float, dict]] = collections.deque()
+        self._condition = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: Dict[str, Any]) -> bool:
+        '''Enqueue an item, applying the overflow policy when the buffer is
+        full; returns False if the given item was dropped
+        '''
+        self.start()
+
+        with self._condition:
+            if len(self._items) >= self.max_size:
+                self.stats['dropped'] += 1
+
+                if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    return False
+
+                self._items.popleft()
+
+            self._items.append((time.monotonic(), item))
+            self.stats['enqueued'] += 1
+
+            # Wake the writer to start the age timer or flush a full batch
+            if len(self._items) == 1 or \
+                    len(self._items) >= DDB_BATCH_WRITE_QUOTA:
+                self._condition.notify()
+
+        return True
+
+    def start(self) -> None:
+        '''Start the background writer thread, if not running already
+        '''
+        if self._writer is not None and self._writer.is_alive():
+            return
+
+        with self._condition:
+            if self._writer is not None and self._writer.is_alive():
+                return
+
+            self._writer = threading.Thread(
+                target=self._run,
+                name='request-log-writer',
+                daemon=True,
+            )
+            self._writer.start()
+
+    def flush(self) -> None:
+        '''Synchronously write all buffered items
+        '''
+        while batch := self._take_batch():
+            self._write_batch(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while (timeout := self._time_to_flush()) != 0:
+                    self._condition.wait(timeout=timeout)
+
+            self.flush()
+
+    def _time_to_flush(self) -> Optional[float]:
+        '''Seconds until buffered items are due, zero if they are due now
+        or None if the buffer is empty
+        '''
+        if not self._items:
+            return None
+
+        if len(self._items) >= DDB_BATCH_WRITE_QUOTA:
+            return 0
+
+        age: float = time.monotonic() - self._items[0][0]
+
+        return max(self.max_age - age, 0)
+
+    def _take_batch(self) -> List[dict]:
+        with self._condition:
+            batch: List[dict] = []
+
+            while self._items and len(batch) < DDB_BATCH_WRITE_QUOTA:
+                batch.append(self._items.popleft()[1])
+
+            return batch
+
+    def _write_batch(self, items: List[dict]) -> None:
+        '''Write items with BatchWriteItem, re-submitting UnprocessedItems
+        with exponential backoff and full jitter
+        '''
+        table_name: str = self.table_name or os.environ['DYNAMODB_TABLE_NAME']
+        requests: List[dict] = [
+            {'PutRequest': {'Item': item}}
+            for item in items
+        ]
+        attempt: int = 0
+
+        self.stats['batches'] += 1
+
+        while True:
+            try:
+                response: dict = get_client('dynamodb').batch_write_item(
+                    RequestItems={table_name: requests},
+                )
+
+            except Exception as error:
+                logger.exception(error)
+                self.stats['failed'] += len(requests)
+                return None
+
+            unprocessed: List[dict] = \
+                response.get('UnprocessedItems', {}).get(table_name, [])
+
+            self.stats['written'] += len(requests) - len(unprocessed)
+
+            attempt += 1
+
+            if not unprocessed:
+                return None
+
+            if attempt >= self.max_attempts:
+                self.stats['failed'] += len(unprocessed)
+                return None
+
+            self.stats['retries'] += 1
+            requests = unprocessed
+
+            time.sleep(random.uniform(
+                0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
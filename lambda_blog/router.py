@@ -0,0 +1,142 @@
+#! /usr/bin/python3.8 Python3.8
+'''Routing of API requests to the functions implementing each action
+
+Actions are registered once, at import time, with the Router.route
+decorator, which declares the HTTP methods, query strings and request body
+fields they accept. Body schemas are compiled into validators on
+registration, so dispatching a request only runs plain type checks.
+'''
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from error_handling import CustomException, ErrorMsg
+from request_context import RequestContext
+
+
+# Field name -> accepted type(s); fields accepting NoneType are optional
+BodySchema = Dict[str, Union[type, Tuple[type, ...]]]
+Validator = Callable[[Any], Dict[str, Any]]
+Handler = Callable[..., dict]  # Called with the request=RequestContext
+
+
+def compile_validator(schema: BodySchema) -> Validator:
+    '''Build a function checking a request body against a schema; it returns
+    the body or raises ValueError
+    '''
+    fields: List[Tuple[str, Tuple[type, ...], bool]] = []
+
+    for name, types in schema.items():
+        types = types if type(types) is tuple else (types,)
+        fields.append((name, types, type(None) not in types))
+
+    # A body made of optional fields only may be omitted altogether
+    body_required: bool = any(required for _, _, required in fields)
+
+    def validate(body: Any) -> Dict[str, Any]:
+        if body is None and not body_required:
+            return {}
+
+        if type(body) is not dict:
+            raise ValueError('Request body must be a JSON object')
+
+        for name, types, required in fields:
+            value: Any = body.get(name)
+
+            if value is None:
+                if required:
+                    raise ValueError(f'Missing body field "{name}"')
+
+            elif not isinstance(value, types):
+                raise ValueError(f'Invalid type of body field "{name}"')
+
+        return body
+
+    return validate
+
+
+class Route:
+
+    def __init__(
+            self,
+            *,
+            action: str,
+            handler: Handler,
+            methods: Iterable[str],
+            params: Iterable[str],
+            body: Optional[BodySchema],
+            body_error: str,
+            ) -> None:
+        self.action: str = action
+        self.handler: Handler = handler
+        self.methods: frozenset = frozenset(methods)
+        self.params: Tuple[str, ...] = tuple(params)
+        self.body_error: str = body_error
+        self.validate_body: Optional[Validator] = \
+            None if body is None else compile_validator(body)
+
+
+class Router:
+    '''Registry of the API actions, dispatching requests to them
+    '''
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, Route] = {}
+
+    def route(
+            self,
+            action: str,
+            *,
+            methods: Iterable[str] = ('GET',),
+            params: Iterable[str] = (),
+            body: Optional[BodySchema] = None,
+            body_error: str = ErrorMsg.INVALID_BODY,
+            ) -> Callable[[Handler], Handler]:
+        '''Register the decorated function as the handler of an action
+
+        Handlers are called with the request context, whose body has been
+        validated against the schema, if any.
+        '''
+        def register(handler: Handler) -> Handler:
+            if action in self.routes:
+                raise ValueError(f'Action already registered: {action}')
+
+            self.routes[action] = Route(
+                action=action,
+                handler=handler,
+                methods=methods,
+                params=params,
+                body=body,
+                body_error=body_error,
+            )
+
+            return handler
+
+        return register
+
+    def dispatch(self, *, request: RequestContext) -> dict:
+        '''Validate a request against the route of its action and call it
+        '''
+        route: Optional[Route] = self.routes.get(request.action)
+
+        if route is None:
+            raise CustomException(
+                ErrorMsg.INVALID_ACTION.format(request.action))
+
+        # Direct invocations (e.g. tests or the console) have no HTTP method
+        if request.method is not None and request.method not in route.methods:
+            raise CustomException(
+                ErrorMsg.METHOD_NOT_ALLOWED.format(
+                    request.method, request.action),
+                status_code=405,
+            )
+
+        for param in route.params:
+            if not request.params.get(param):
+                raise CustomException(ErrorMsg.MISSING_PARAM.format(param))
+
+        if route.validate_body is not None:
+            try:
+                request.body = route.validate_body(request.body)
+            except ValueError as error:
+                raise CustomException(route.body_error) from error
+
+        return route.handler(request=request)
@@ -0,0 +1,173 @@
+#! /usr/bin/python3.8 Python3.8
+'''Structured logging as one-line JSON records, queryable in CloudWatch Logs
+Insights (e.g. "fields action, duration_ms | filter level = 'INFO'")
+
+Records below the configured level are dropped before anything is
+serialized, and field values may be given as zero-argument callables that
+are only evaluated when the record is written. Payload records can be
+sampled, long strings and lists are truncated and sensitive keys redacted;
+JSON documents held in string fields (e.g. API Gateway request and response
+bodies) are decoded first, so that keys inside them are redacted too.
+'''
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, FrozenSet, Iterable, Optional, TextIO
+
+
+LEVELS: Dict[str, int] = {
+    'DEBUG': 10,
+    'INFO': 20,
+    'WARNING': 30,
+    'ERROR': 40,
+}
+
+# Built once, rather than by every json.dumps call with custom options
+_encoder = json.JSONEncoder(default=str, separators=(',', ':'))
+
+REDACTED: str = '[REDACTED]'
+DEFAULT_REDACT_KEYS: str = \
+    'authorization,cookie,set-cookie,x-api-key,publisher-email'
+DEFAULT_JSON_KEYS: str = 'body'
+
+
+class StructuredLogger:
+
+    def __init__(
+            self,
+            *,
+            level: str = 'INFO',
+            sample_rate: float = 1.0,
+            max_field_size: int = 1000,
+            max_items: int = 20,
+            redact_keys: Iterable[str] = (),
+            json_keys: Iterable[str] = (),
+            stream: Optional[TextIO] = None,
+            ) -> None:
+        if level.upper() not in LEVELS:
+            raise ValueError(f'Invalid log level: {level}')
+
+        self.level: int = LEVELS[level.upper()]
+        self.sample_rate: float = sample_rate
+        self.max_field_size: int = max_field_size
+        self.max_items: int = max_items
+        self.redact_keys: FrozenSet[str] = frozenset(
+            key.strip().lower() for key in redact_keys if key.strip())
+        self.json_keys: FrozenSet[str] = frozenset(
+            key.strip().lower() for key in json_keys if key.strip())
+        self.stream: Optional[TextIO] = stream
+
+    @classmethod
+    def from_env(cls) -> 'StructuredLogger':
+        return cls(
+            level=os.environ.get('LOG_LEVEL', 'INFO'),
+            sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1)),
+            max_field_size=int(os.environ.get('LOG_MAX_FIELD_SIZE', 1000)),
+            max_items=int(os.environ.get('LOG_MAX_ITEMS', 20)),
+            redact_keys=os.environ.get(
+                'LOG_REDACT_KEYS', DEFAULT_REDACT_KEYS).split(','),
+            json_keys=os.environ.get(
+                'LOG_JSON_KEYS', DEFAULT_JSON_KEYS).split(','),
+        )
+
+    def is_enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def sample(self) -> bool:
+        '''Draw whether sampled records (e.g. of one invocation) are written
+        '''
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def debug(self, message: str, **fields: Any) -> None:
+        self.log('DEBUG', message, **fields)
+
+    def info(self, message: str, **fields: Any) -> None:
+        self.log('INFO', message, **fields)
+
+    def warning(self, message: str, **fields: Any) -> None:
+        self.log('WARNING', message, **fields)
+
+    def error(self, message: str, **fields: Any) -> None:
+        self.log('ERROR', message, **fields)
+
+    def log(
+            self,
+            level: str,
+            message: str,
+            *,
+            sampled: bool = True,
+            **fields: Any,
+            ) -> None:
+        '''Write a record, unless its level is disabled or it was sampled out
+        '''
+        if not sampled or not self.is_enabled(level):
+            return None
+
+        record: Dict[str, Any] = {
+            'timestamp': round(time.time(), 3),
+            'level': level,
+            'message': message,
+        }
+
+        for name, value in fields.items():
+            if callable(value):
+                value = value()
+
+            record[name] = self.prepare(value, key=name)
+
+        stream: TextIO = self.stream or sys.stdout
+        stream.write(_encoder.encode(record) + '\n')
+
+    def prepare(self, value: Any, *, key: Optional[str] = None) -> Any:
+        '''Redact, truncate and recursively copy a value for serialization
+        '''
+        if key is not None and key.lower() in self.redact_keys:
+            return REDACTED
+
+        if isinstance(value, str):
+            if key is not None and key.lower() in self.json_keys:
+                document: Any = decode_json(value)
+
+                if document is not None:
+                    return self.prepare(document)
+
+            return self.truncate(value)
+
+        if isinstance(value, dict):
+            return {
+                name: self.prepare(item, key=str(name))
+                for name, item in value.items()
+            }
+
+        if isinstance(value, (list, tuple)):
+            items: list = [
+                self.prepare(item) for item in value[:self.max_items]
+            ]
+
+            if len(value) > self.max_items:
+                items.append(f'<{len(value) - self.max_items} more items>')
+
+            return items
+
+        return value
+
+    def truncate(self, value: str) -> str:
+        if len(value) <= self.max_field_size:
+            return value
+
+        return f'{value[:self.max_field_size]}' \
+            f'<{len(value) - self.max_field_size} more characters>'
+
+
+def decode_json(value: str) -> Optional[Any]:
+    '''Decode a string holding a JSON object or array, None otherwise
+    '''
+    if not value.lstrip().startswith(('{', '[')):
+        return None
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
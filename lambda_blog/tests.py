@@ -5,6 +5,14 @@ from unittest import mock
 import pytest
 
 from error_handling import ErrorMsg
+from request_context import RequestContext
+
+
+def request_with(*, body=None, params=None):
+    return RequestContext({
+        'body': json.dumps(body),
+        'queryStringParameters': params,
+    })
 
 
 @mock.patch('blog.store_http_request_info')
@@ -62,39 +70,43 @@ def test_handler_invalid_action():
     assert body['error'] == ErrorMsg.INVALID_ACTION.format(dummy_action)
 
 
-@mock.patch('blog.get_latest_articles')
-@mock.patch('blog.put_article')
-@mock.patch('blog.like_article')
-def test_handler_valid_actions(
-        patch_like_article,
-        patch_put_article,
-        patch_get_latest_articles,
-        ):
-    from blog import handler
+def test_handler_valid_actions():
+    import blog
 
     dummy_public_message = 'This is a dummy message'
     dummy_results = {
         'public_message': dummy_public_message,
     }
-    patch_get_latest_articles.return_value = dummy_results
-    patch_put_article.return_value = dummy_results
-    patch_like_article.return_value = dummy_results
+    dummy_body = {
+        'article': {},
+        'article_id': 'abc',
+    }
 
     actions = {
-        'get-latest-articles': patch_get_latest_articles,
-        'publish-article': patch_put_article,
-        'like-article': patch_like_article,
+        'get-latest-articles': 'GET',
+        'publish-article': 'POST',
+        'like-article': 'POST',
     }
 
-    for action, patch_executor in actions.items():
+    for action, method in actions.items():
+        route = blog.ROUTER.routes[action]
         dummy_event = {
+            'httpMethod': method,
             'queryStringParameters': {
                 'action': action,
             },
+            'body': json.dumps(dummy_body),
         }
-        response = handler(event=dummy_event, context=None)
 
-        patch_executor.assert_called_with(event=dummy_event)
+        with mock.patch.object(route, 'handler') as patch_executor, \
+                mock.patch('blog.store_http_request_info'):
+            patch_executor.return_value = dummy_results
+            response = blog.handler(event=dummy_event, context=None)
+
+        request = patch_executor.call_args[1]['request']
+
+        assert request.event is dummy_event
+        assert request.body == dummy_body
 
         assert type(response) is dict
         assert 'body' in response
@@ -110,3 +122,893 @@ def test_handler_valid_actions(
         assert 'data' in body
         assert body['message'] == dummy_public_message
         assert body['data'] is None
+
+
+@mock.patch('blog.store_http_request_info')
+def test_router_validation(patch_store_http_request_info):
+    import blog
+
+    def call(method, body):
+        response = blog.handler(event={
+            'httpMethod': method,
+            'queryStringParameters': {'action': 'like-article'},
+            'body': body,
+        }, context=None)
+
+        return response['statusCode'], json.loads(response['body'])['error']
+
+    assert call('GET', '{"article_id": "abc"}') == (
+        405, ErrorMsg.METHOD_NOT_ALLOWED.format('GET', 'like-article'))
+    assert call('POST', 'not json') == (
+        400, ErrorMsg.UNAVAILABLE_ARTICLE_ID)
+    assert call('POST', '{"article_id": 123}') == (
+        400, ErrorMsg.UNAVAILABLE_ARTICLE_ID)
+    assert call('POST', '{"article_id": "abc", "request_token": 1}') == (
+        400, ErrorMsg.UNAVAILABLE_ARTICLE_ID)
+
+    # The body is parsed once and shared with request logging
+    assert patch_store_http_request_info.call_args[1]['request'].body == {
+        'article_id': 'abc',
+        'request_token': 1,
+    }
+
+
+def test_shared_clients(monkeypatch):
+    import aws_clients
+
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    aws_clients.reset_clients()
+
+    client = aws_clients.get_client('dynamodb')
+
+    assert aws_clients.get_client('dynamodb') is client
+    assert client.meta.config.max_pool_connections == \
+        aws_clients.MAX_POOL_CONNECTIONS
+
+    dummy_client = object()
+    aws_clients.set_client('dynamodb', dummy_client)
+
+    assert aws_clients.get_client('dynamodb') is dummy_client
+
+    aws_clients.reset_clients()
+
+
+@mock.patch('request_log.get_client')
+def test_request_log_buffer(patch_get_client):
+    from request_log import RequestLogBuffer, OVERFLOW_DROP_NEWEST
+
+    patch_get_client.return_value.batch_write_item.return_value = {
+        'UnprocessedItems': {},
+    }
+
+    buffer = RequestLogBuffer(
+        max_size=30,
+        overflow_policy=OVERFLOW_DROP_NEWEST,
+        table_name='dummy-table',
+    )
+    buffer.start = mock.Mock()  # Flush synchronously in the test
+
+    results = [buffer.put({'id': {'S': str(i)}}) for i in range(40)]
+
+    assert results.count(False) == 10
+    assert buffer.stats['dropped'] == 10
+    assert len(buffer) == 30
+
+    buffer.flush()
+
+    batch_write = patch_get_client.return_value.batch_write_item
+
+    assert batch_write.call_count == 2
+    assert len(batch_write.call_args_list[0][1]['RequestItems']['dummy-table']) == 25  # NOQA
+    assert buffer.stats['written'] == 30
+    assert len(buffer) == 0
+
+
+@mock.patch('request_log.time.sleep')
+@mock.patch('request_log.get_client')
+def test_request_log_buffer_retries_unprocessed(
+        patch_get_client,
+        patch_sleep,
+        ):
+    from request_log import RequestLogBuffer
+
+    unprocessed = [{'PutRequest': {'Item': {'id': {'S': '0'}}}}]
+
+    patch_get_client.return_value.batch_write_item.side_effect = [
+        {'UnprocessedItems': {'dummy-table': unprocessed}},
+        {'UnprocessedItems': {}},
+    ]
+
+    buffer = RequestLogBuffer(table_name='dummy-table')
+    buffer.start = mock.Mock()
+
+    for i in range(3):
+        buffer.put({'id': {'S': str(i)}})
+
+    buffer.flush()
+
+    batch_write = patch_get_client.return_value.batch_write_item
+
+    assert batch_write.call_count == 2
+    assert batch_write.call_args[1]['RequestItems']['dummy-table'] == \
+        unprocessed
+    assert patch_sleep.call_count == 1
+    assert buffer.stats['written'] == 3
+    assert buffer.stats['retries'] == 1
+    assert buffer.stats['failed'] == 0
+
+
+def test_request_log_pending_reported(monkeypatch):
+    import io
+    import blog
+    from request_log import RequestLogBuffer
+    from structured_log import StructuredLogger
+
+    stream = io.StringIO()
+    buffer = RequestLogBuffer(table_name='dummy-table')
+    buffer.start = mock.Mock()  # The writer doesn't run while frozen
+
+    monkeypatch.setattr(blog, 'LOG', StructuredLogger(stream=stream))
+    monkeypatch.setattr(blog, 'REQUEST_LOG', buffer)
+    monkeypatch.setattr(
+        blog,
+        'store_http_request_info',
+        lambda request: buffer.put({'id': {'S': 'abc'}}),
+    )
+
+    blog.handler(event={'queryStringParameters': {}}, context=None)
+
+    # Items left in memory by an invocation are counted in its summary
+    assert json.loads(stream.getvalue())['request_log_pending'] == 1
+
+
+def test_swr_cache():
+    import threading
+    import time
+
+    from cache import SwrCache
+
+    cache = SwrCache(soft_ttl=0.05, hard_ttl=10)
+    loader = mock.Mock(return_value=['article'])
+
+    assert cache.get(loader=loader) == ['article']
+    assert cache.get(loader=loader) == ['article']
+    assert loader.call_count == 1
+    assert cache.stats['misses'] == 1
+    assert cache.stats['hits'] == 1
+
+    # Stale value is served while a single background refresh runs
+    refreshed = threading.Event()
+    loader.side_effect = lambda: refreshed.wait(1) and ['refreshed']
+
+    time.sleep(0.06)
+
+    assert cache.get(loader=loader) == ['article']
+    assert cache.get(loader=loader) == ['article']
+    assert cache.stats['stale'] == 2
+
+    refreshed.set()
+    time.sleep(0.05)
+
+    assert loader.call_count == 2
+    assert cache.get(loader=loader) == ['refreshed']
+
+
+def test_swr_cache_empty_and_negative():
+    from cache import MISSING, SwrCache
+
+    cache = SwrCache(soft_ttl=10, hard_ttl=10, negative_ttl=10)
+
+    assert cache.peek() is MISSING
+
+    # An empty list is a cached value, not a miss
+    loader = mock.Mock(return_value=[])
+
+    assert cache.get(loader=loader) == []
+    assert cache.get(loader=loader) == []
+    assert cache.peek() == []
+    assert loader.call_count == 1
+
+    # Failed loads are not repeated within the negative TTL
+    cache.invalidate()
+    loader = mock.Mock(side_effect=RuntimeError('table not found'))
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            cache.get(loader=loader)
+
+    assert loader.call_count == 1
+    assert cache.stats['negative_hits'] == 2
+
+
+@mock.patch('blog.get_client')
+def test_articles_cache_write_through(patch_get_client, monkeypatch):
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    from articles import ArticleList
+
+    blog.LATEST_ARTICLES_CACHE.set(
+        value=ArticleList([{'id': 'abc', 'likes': 1}]))
+
+    client = patch_get_client.return_value
+    client.update_item.return_value = {'Attributes': {'likes': {'N': '2'}}}
+    client.put_item.return_value = {
+        'ResponseMetadata': {'HTTPStatusCode': 200},
+    }
+
+    blog.like_article(request=request_with(body={'article_id': 'abc'}))
+    blog.put_article(request=request_with(body={'article': {
+        'publisher-email': 'john@example.com',
+        'publisher-name': 'John',
+        'title': 'Hello',
+        'body': 'World',
+    }}))
+
+    results = blog.get_latest_articles(request=request_with())
+    articles = results['public_data']['articles']
+
+    assert client.query.call_count == 0
+    assert [article['title'] for article in articles[:1]] == ['Hello']
+    assert articles[1] == {'id': 'abc', 'likes': 2}
+
+
+@mock.patch('blog.query_latest_articles')
+def test_shared_cache_tier(patch_query_latest_articles):
+    import blog
+    from articles import ArticleList
+    from cache_backends import RedisBackend
+
+    class FakeRedis(dict):
+
+        def set(self, key, value, ex=None):
+            self[key] = value
+
+        def delete(self, key):
+            self.pop(key, None)
+
+    articles = [{'id': 'abc', 'likes': 0}]
+    patch_query_latest_articles.return_value = ArticleList(articles)
+
+    shared_cache = RedisBackend(ttl=60, client=FakeRedis())
+
+    with mock.patch('blog.SHARED_CACHE', shared_cache):
+        assert blog.load_latest_articles().articles == articles
+        assert blog.load_latest_articles().articles == articles
+
+    assert patch_query_latest_articles.call_count == 1
+
+
+def test_latest_articles_pre_encoded_body():
+    import blog
+    from articles import ArticleList
+
+    articles = ArticleList([{'id': 'abc', 'likes': 1}])
+    blog.LATEST_ARTICLES_CACHE.set(value=articles)
+
+    event = {'queryStringParameters': {'action': 'get-latest-articles'}}
+
+    with mock.patch('blog.json.dumps', wraps=json.dumps) as patch_dumps:
+        first = blog.handler(event=event, context=None)
+        second = blog.handler(event=event, context=None)
+
+    # Body encoded for the first request only, the second is a cache hit
+    encoded_bodies = [
+        call for call in patch_dumps.call_args_list
+        if 'action' in call[0][0]
+    ]
+    assert len(encoded_bodies) == 1
+
+    assert first['body'] == second['body']
+    assert first['headers']['ETag'] == second['headers']['ETag']
+    assert json.loads(first['body'])['data']['articles'] == \
+        articles.articles
+
+    articles.update_likes('abc', 2)
+
+    third = blog.handler(event=event, context=None)
+
+    assert third['headers']['ETag'] != first['headers']['ETag']
+
+
+def test_prepend_keeps_page_limit():
+    import blog
+    from articles import ArticleList
+    from cursors import decode_cursor
+
+    keys = [
+        blog.article_key(article_id=article_id, publish_timestamp=timestamp)
+        for article_id, timestamp in [('c', 3), ('b', 2), ('a', 1)]
+    ]
+    page = ArticleList(
+        [{'id': 'c'}, {'id': 'b'}, {'id': 'a'}],
+        next_cursor='cursor',
+        limit=3,
+        keys=keys,
+    )
+
+    page.prepend(
+        {'id': 'd'},
+        key=blog.article_key(article_id='d', publish_timestamp=4),
+    )
+
+    assert [article['id'] for article in page.articles] == ['d', 'c', 'b']
+    assert 'a' not in page
+    assert decode_cursor(page.next_cursor) == keys[1]
+
+    restored = ArticleList.from_dict(page.to_dict())
+
+    assert restored.limit == 3
+    assert restored.keys == page.keys
+
+
+def test_latest_articles_conditional_get():
+    import blog
+    from articles import ArticleList
+
+    blog.LATEST_ARTICLES_CACHE.set(value=ArticleList([{'id': 'abc'}]))
+
+    event = {'queryStringParameters': {'action': 'get-latest-articles'}}
+    response = blog.handler(event=event, context=None)
+
+    assert response['statusCode'] == 200
+    assert 'max-age' in response['headers']['Cache-Control']
+
+    etag = response['headers']['ETag']
+    assert 'Last-Modified' not in response['headers']
+
+    for headers in [
+            {'If-None-Match': etag},
+            {'if-none-match': f'"other", W/{etag}'},
+            ]:
+        response = blog.handler(event={**event, 'headers': headers}, context=None)  # NOQA
+
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['headers']['ETag'] == etag
+
+    response = blog.handler(
+        event={**event, 'headers': {'If-None-Match': '"other"'}},
+        context=None,
+    )
+
+    assert response['statusCode'] == 200
+
+
+@mock.patch('blog.get_client')
+def test_latest_articles_pagination(patch_get_client, monkeypatch):
+    import blog
+    from cursors import decode_cursor
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setenv('DYNAMODB_LATEST_ARTICLES_INDEX', 'dummy-index')
+
+    last_key = {
+        'id': {'S': 'abc'},
+        'item-type': {'S': 'blog-article'},
+        'publish-timestamp': {'N': '1594596504'},
+    }
+    patch_get_client.return_value.query.return_value = {
+        'Items': [],
+        'LastEvaluatedKey': last_key,
+    }
+
+    def get_page(**params):
+        event = {
+            'queryStringParameters': {
+                'action': 'get-latest-articles',
+                **params,
+            },
+        }
+
+        return blog.handler(event=event, context=None)
+
+    response = get_page(limit='1')
+    next_cursor = json.loads(response['body'])['data']['next_cursor']
+
+    assert decode_cursor(next_cursor) == last_key
+
+    get_page(limit='1', cursor=next_cursor)
+    get_page(limit='1', cursor=next_cursor)  # Served from the page cache
+
+    query = patch_get_client.return_value.query
+
+    assert query.call_count == 2
+    assert query.call_args[1]['Limit'] == 1
+    assert query.call_args[1]['ExclusiveStartKey'] == last_key
+
+    for params in [{'cursor': next_cursor[:-4]}, {'limit': '500'}]:
+        response = get_page(**params)
+
+        assert response['statusCode'] == 400
+        assert 'error' in json.loads(response['body'])
+
+    # Without a signing key, the first page is listed without a cursor
+    monkeypatch.delenv('CURSOR_SIGNING_KEY')
+
+    response = get_page(limit='2')
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['data']['next_cursor'] is None
+
+
+@mock.patch('blog.get_client')
+def test_summary_listing_and_get_article(
+        patch_get_client,
+        monkeypatch,
+        article_item,
+        ):
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setenv('DYNAMODB_SUMMARY_ARTICLES_INDEX', 'dummy-summary')
+
+    item = article_item(likes={'N': '3'}, excerpt={'S': 'Lorem...'})
+    summary_item = {name: item[name] for name in item if name != 'body'}
+
+    client = patch_get_client.return_value
+    client.query.return_value = {'Items': [summary_item]}
+    client.get_item.return_value = {'Item': item}
+
+    event = {
+        'queryStringParameters': {
+            'action': 'get-latest-articles',
+            'fields': 'summary',
+        },
+    }
+    response = blog.handler(event=event, context=None)
+    article = json.loads(response['body'])['data']['articles'][0]
+
+    assert client.query.call_args[1]['IndexName'] == 'dummy-summary'
+    assert 'ProjectionExpression' in client.query.call_args[1]
+    assert article['excerpt'] == 'Lorem...'
+    assert 'body' not in article
+
+    event = {
+        'queryStringParameters': {
+            'action': 'get-article',
+            'article_id': 'abc',
+        },
+    }
+    response = blog.handler(event=event, context=None)
+
+    assert json.loads(response['body'])['data']['article']['body'] == \
+        'Lorem ipsum'
+
+
+@mock.patch('blog.time.sleep')
+@mock.patch('blog.get_client')
+def test_get_many_articles(
+        patch_get_client,
+        patch_sleep,
+        monkeypatch,
+        article_item,
+        ):
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+
+    client = patch_get_client.return_value
+    client.batch_get_item.side_effect = [
+        {
+            'Responses': {'dummy-table': [article_item('a')]},
+            'UnprocessedKeys': {
+                'dummy-table': {'Keys': [{'id': {'S': 'b'}}]},
+            },
+        },
+        {
+            'Responses': {'dummy-table': [article_item('b')]},
+            'UnprocessedKeys': {},
+        },
+    ]
+
+    event = {
+        'queryStringParameters': {
+            'action': 'get-article',
+            'article_ids': 'a,b,c,a',
+        },
+    }
+
+    data = json.loads(blog.handler(event=event, context=None)['body'])['data']
+
+    assert [article['id'] for article in data['articles']] == ['a', 'b']
+    assert data['missing_ids'] == ['c']
+    assert client.batch_get_item.call_count == 2
+    assert patch_sleep.call_count == 1
+
+    # Found articles are now served from the per-article cache
+    event['queryStringParameters']['article_ids'] = 'a,b'
+    blog.handler(event=event, context=None)
+
+    assert client.batch_get_item.call_count == 2
+    assert blog.ARTICLES_CACHE.stats['hits'] == 2
+
+
+def test_lru_cache_eviction():
+    from cache import MISSING, LruCache
+
+    cache = LruCache(max_items=3, max_size=10, ttl=60)
+
+    cache.put('a', 'A', size=4)
+    cache.put('b', 'B', size=4)
+    cache.get('a')
+    cache.put('c', 'C', size=4)  # Over max_size, evicts "b" (least used)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 'A'
+    assert cache.size == 8
+    assert cache.stats['evictions'] == 1
+
+
+@mock.patch('blog.get_client')
+def test_sharded_likes(patch_get_client, monkeypatch, article_item):
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setattr(blog, 'LIKES_SHARD_COUNT', 4)
+
+    client = patch_get_client.return_value
+    client.get_item.return_value = {'Item': article_item()}
+    client.batch_get_item.return_value = {
+        'Responses': {
+            'dummy-table': [
+                {'article-id': {'S': 'abc'}, 'likes': {'N': '2'}},
+                {'article-id': {'S': 'abc'}, 'likes': {'N': '3'}},
+            ],
+        },
+    }
+
+    for expected_likes in [6, 7]:
+        results = blog.like_article(
+            request=request_with(body={'article_id': 'abc'}))
+
+        assert results['public_data']['new_likes_count'] == expected_likes
+
+    shard_keys = [
+        call[1]['Key']['id']['S']
+        for call in client.update_item.call_args_list
+    ]
+
+    assert all(key.startswith('abc#likes-') for key in shard_keys)
+    assert client.get_item.call_count == 1  # Article served from cache
+
+
+@mock.patch('blog.get_client')
+def test_like_request_tokens(patch_get_client, monkeypatch):
+    import botocore.exceptions
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setattr(
+        blog, 'estimated_likes', mock.Mock(return_value=5))
+
+    client = patch_get_client.return_value
+
+    def like(token):
+        return blog.like_article(request=request_with(body={
+            'article_id': 'abc',
+            'request_token': token,
+        }))
+
+    def cancelled(*codes):
+        return botocore.exceptions.ClientError({
+            'Error': {'Code': 'TransactionCanceledException'},
+            'CancellationReasons': [{'Code': code} for code in codes],
+        }, 'TransactWriteItems')
+
+    liked = like('token-1234')
+
+    assert liked['public_message'] == 'Article liked'
+    assert liked['public_data']['new_likes_count'] == 6
+
+    # The token and the like are written together
+    token_put, likes_update = \
+        client.transact_write_items.call_args[1]['TransactItems']
+
+    assert token_put['Put']['Item']['id']['S'] == 'like-token#token-1234'
+    assert likes_update['Update']['Key']['id']['S'] == 'abc'
+
+    # Retry served by the same container
+    assert like('token-1234')['public_data']['new_likes_count'] == 5
+    assert client.transact_write_items.call_count == 1
+
+    # Retry served by another container, which already claimed the token
+    client.transact_write_items.side_effect = cancelled(
+        'ConditionalCheckFailed', 'None')
+
+    assert like('token-5678')['public_message'] == 'Article already liked'
+    assert blog.LIKE_TOKENS_CACHE.get('token-5678') is not blog.MISSING
+
+    # Tokens of failed likes are not recorded, so the like can be retried
+    client.transact_write_items.side_effect = cancelled(
+        'None', 'ConditionalCheckFailed')
+
+    with pytest.raises(blog.CustomException):
+        like('token-9012')
+
+    client.transact_write_items.side_effect = RuntimeError('throttled')
+
+    like('token-9012')
+
+    assert blog.LIKE_TOKENS_CACHE.get('token-9012') is blog.MISSING
+    assert client.put_item.call_count == 0
+    assert client.update_item.call_count == 0
+
+    with pytest.raises(blog.CustomException):
+        like('bad token')
+
+
+@mock.patch('blog.get_client')
+def test_publish_articles(patch_get_client, monkeypatch):
+    import botocore.exceptions
+    import blog
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setattr(blog, 'SHARED_CACHE', mock.Mock())
+
+    def article(title):
+        return {
+            'publisher-email': 'john@example.com',
+            'publisher-name': 'John',
+            'title': title,
+            'body': 'Lorem ipsum',
+        }
+
+    existing_id = blog.new_article_id(article('Old'))
+
+    def put_item(**kwargs):
+        if kwargs['Item']['id']['S'] == existing_id:
+            raise botocore.exceptions.ClientError(
+                {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                'PutItem',
+            )
+
+    patch_get_client.return_value.put_item.side_effect = put_item
+
+    blog.LATEST_ARTICLES_CACHE.set(value=blog.ArticleList([{'id': 'abc'}]))
+
+    body = {'articles': [
+        article('New'),
+        article('Old'),
+        article('New'),
+        {'title': 'Incomplete'},
+        article('Newer'),
+    ]}
+
+    results = blog.put_articles(request=request_with(body=body))
+
+    assert [
+        status['status'] for status in results['public_data']['articles']
+    ] == ['published', 'already-exists', 'duplicate', 'invalid', 'published']
+    assert patch_get_client.return_value.put_item.call_count == 3
+
+    new_id = results['public_data']['articles'][0]['id']
+
+    assert blog.ARTICLES_CACHE.get(new_id)['title'] == 'New'
+    assert blog.ARTICLES_CACHE.get(existing_id) is blog.MISSING
+    blog.SHARED_CACHE.delete.assert_called_once()
+
+    # First pages are reloaded rather than grown by every published article
+    assert blog.LATEST_ARTICLES_CACHE.peek() is blog.MISSING
+
+
+@mock.patch('export.get_client')
+def test_export_articles(patch_get_client, monkeypatch):
+    import blog
+    from export import parallel_scan, to_ndjson
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+
+    def scan(**kwargs):
+        segment = kwargs['Segment']
+        page = 1 if 'ExclusiveStartKey' in kwargs else 0
+        response = {
+            'Items': [
+                {'id': {'S': f'{segment}-{page}'}, 'likes': {'N': '3'}},
+            ],
+        }
+
+        if page == 0:
+            response['LastEvaluatedKey'] = {'id': {'S': f'{segment}-0'}}
+
+        return response
+
+    patch_get_client.return_value.scan.side_effect = scan
+
+    lines = list(to_ndjson(parallel_scan(
+        table_name='dummy-table', total_segments=3)))
+
+    assert sorted(json.loads(line)['id'] for line in lines) == [
+        '0-0', '0-1', '1-0', '1-1', '2-0', '2-1',
+    ]
+    assert json.loads(lines[0])['likes'] == 3
+
+    params = {'segment': '1', 'total_segments': '3'}
+    results = blog.export_articles(request=request_with(params=params))
+    cursor = results['headers']['X-Next-Cursor']
+
+    assert json.loads(results['raw_body'])['id'] == '1-0'
+
+    params['cursor'] = cursor
+    results = blog.export_articles(request=request_with(params=params))
+
+    assert json.loads(results['raw_body'])['id'] == '1-1'
+    assert 'X-Next-Cursor' not in results['headers']
+
+    # Cursors only continue the segment they were returned for
+    for other in [{'segment': '2'}, {'total_segments': '4'}]:
+        with pytest.raises(blog.CustomException) as error:
+            blog.export_articles(request=request_with(params={
+                **params, **other}))
+
+        assert error.value.public_message == ErrorMsg.INVALID_CURSOR
+        assert error.value.status_code == 400
+
+    params['segment'] = '3'
+
+    with pytest.raises(blog.CustomException):
+        blog.export_articles(request=request_with(params=params))
+
+
+@mock.patch('cursors.get_client')
+def test_cursor_signing_key(patch_get_client, monkeypatch):
+    import cursors
+
+    key = {'id': {'S': 'abc'}}
+    cursor = cursors.encode_cursor(key)
+
+    # Cursors signed with another key are rejected
+    monkeypatch.setenv('CURSOR_SIGNING_KEY', 'another-signing-key')
+
+    with pytest.raises(cursors.CustomException):
+        cursors.decode_cursor(cursor)
+
+    # Deployed functions read the key from Secrets Manager, once
+    monkeypatch.delenv('CURSOR_SIGNING_KEY')
+    monkeypatch.setenv('CURSOR_SIGNING_KEY_SECRET_ARN', 'dummy-secret-arn')
+    patch_get_client.return_value.get_secret_value.return_value = {
+        'SecretString': 'secret-signing-key',
+    }
+    cursors.secret_signing_key.cache_clear()
+
+    assert cursors.decode_cursor(cursors.encode_cursor(key)) == key
+    assert patch_get_client.return_value.get_secret_value.call_count == 1
+
+    cursors.secret_signing_key.cache_clear()
+
+    # No guessable fallback (e.g. the table name) without a key
+    monkeypatch.delenv('CURSOR_SIGNING_KEY_SECRET_ARN')
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+
+    with pytest.raises(RuntimeError):
+        cursors.encode_cursor(key)
+
+    with pytest.raises(cursors.CustomException):
+        cursors.decode_cursor(cursor)
+
+
+def test_request_context():
+    event = {
+        'httpMethod': 'POST',
+        'headers': {
+            'CloudFront-Is-Desktop-Viewer': 'false',
+            'CloudFront-Is-Mobile-Viewer': 'true',
+            'CloudFront-Viewer-Country': 'PT',
+        },
+        'queryStringParameters': {'action': 'like-article'},
+        'body': json.dumps({'article_id': 'abc'}),
+    }
+    request = RequestContext(event)
+
+    with mock.patch('json.loads', wraps=json.loads) as patch_loads:
+        assert request.body == {'article_id': 'abc'}
+        assert request.body == {'article_id': 'abc'}
+        assert patch_loads.call_count == 1
+
+    assert request.action == 'like-article'
+    assert request.headers['cloudfront-viewer-country'] == 'PT'
+    assert request.device_type == 'Mobile'
+    assert request.country == 'PT'
+
+    request = RequestContext({'body': 'not json'})
+
+    assert request.body is None
+    assert request.params == {}
+    assert request.device_type == 'Unknown'
+    assert request.country is None
+
+
+def test_structured_log():
+    import io
+    from structured_log import StructuredLogger
+
+    stream = io.StringIO()
+    log = StructuredLogger(
+        level='INFO',
+        max_field_size=5,
+        max_items=2,
+        redact_keys=['Authorization'],
+        stream=stream,
+    )
+    payload = mock.Mock()
+
+    # Lazy fields are not evaluated when the level is disabled
+    log.debug('Request', event=payload)
+    log.info('Skipped', sampled=False, event=payload)
+
+    assert stream.getvalue() == ''
+    assert not payload.called
+
+    log.info(
+        'Request',
+        event=lambda: {
+            'headers': {'authorization': 'secret'},
+            'body': 'Lorem ipsum',
+            'ids': [1, 2, 3],
+        },
+    )
+
+    lines = stream.getvalue().splitlines()
+    record = json.loads(lines[0])
+
+    assert len(lines) == 1
+    assert record['level'] == 'INFO'
+    assert record['event'] == {
+        'headers': {'authorization': '[REDACTED]'},
+        'body': 'Lorem<6 more characters>',
+        'ids': [1, 2, '<1 more items>'],
+    }
+
+
+@mock.patch('blog.store_http_request_info')
+@mock.patch('blog.get_client')
+def test_debug_log_redacts_bodies(
+        patch_get_client,
+        patch_store_http_request_info,
+        monkeypatch,
+        ):
+    import io
+    import blog
+    from structured_log import (
+        DEFAULT_JSON_KEYS,
+        DEFAULT_REDACT_KEYS,
+        StructuredLogger,
+    )
+
+    stream = io.StringIO()
+
+    monkeypatch.setenv('DYNAMODB_TABLE_NAME', 'dummy-table')
+    monkeypatch.setattr(blog, 'LOG', StructuredLogger(
+        level='DEBUG',
+        redact_keys=DEFAULT_REDACT_KEYS.split(','),
+        json_keys=DEFAULT_JSON_KEYS.split(','),
+        stream=stream,
+    ))
+    monkeypatch.setattr(blog, 'add_published_articles', mock.Mock())
+
+    patch_get_client.return_value.put_item.return_value = {
+        'ResponseMetadata': {'HTTPStatusCode': 200},
+    }
+
+    blog.handler(event={
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'publish-article'},
+        'body': json.dumps({'article': {
+            'publisher-email': 'john@example.com',
+            'publisher-name': 'John',
+            'title': 'Hello',
+            'body': 'Lorem ipsum',
+        }}),
+    }, context=None)
+
+    records = {
+        record['message']: record
+        for record in map(json.loads, stream.getvalue().splitlines())
+    }
+    request_article = records['Request']['event']['body']['article']
+    response_data = records['Response']['response']['body']['data']
+
+    assert 'john@example.com' not in stream.getvalue()
+    assert request_article['publisher-email'] == '[REDACTED]'
+    assert request_article['body'] == 'Lorem ipsum'
+    assert response_data['article']['publisher-email'] == '[REDACTED]'
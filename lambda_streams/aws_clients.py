@@ -0,0 +1,71 @@
+#! /usr/bin/python3.8 Python3.8
+'''Shared boto3 clients, created lazily and reused for the container lifetime
+
+Creating a boto3 client rebuilds the session, endpoint resolver and HTTP
+connection pool. Lambda containers serve many invocations, so clients are
+kept in a module-level registry and built only once per service.
+'''
+import os
+import threading
+from typing import Any, Dict
+
+import boto3
+import botocore.config
+
+
+MAX_POOL_CONNECTIONS: int = int(
+    os.environ.get('AWS_CLIENT_MAX_POOL_CONNECTIONS', 25))
+TCP_KEEPALIVE: bool = \
+    os.environ.get('AWS_CLIENT_TCP_KEEPALIVE', 'true').lower() == 'true'
+CONNECT_TIMEOUT: float = float(os.environ.get('AWS_CLIENT_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT: float = float(os.environ.get('AWS_CLIENT_READ_TIMEOUT', 5))
+RETRY_MODE: str = os.environ.get('AWS_CLIENT_RETRY_MODE', 'standard')
+RETRY_MAX_ATTEMPTS: int = int(os.environ.get('AWS_CLIENT_RETRY_ATTEMPTS', 3))
+
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def client_config() -> botocore.config.Config:
+    '''Connection pool, keep-alive, timeout and retry settings for clients
+    '''
+    return botocore.config.Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=TCP_KEEPALIVE,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={
+            'mode': RETRY_MODE,
+            'max_attempts': RETRY_MAX_ATTEMPTS,
+        },
+    )
+
+
+def get_client(service_name: str) -> Any:
+    '''Return the shared client for a service, creating it on first use
+    '''
+    client = _clients.get(service_name)
+
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+
+            if client is None:
+                client = boto3.client(service_name, config=client_config())
+                _clients[service_name] = client
+
+    return client
+
+
+def set_client(service_name: str, client: Any) -> None:
+    '''Replace the shared client for a service (e.g. with a Stubber in tests)
+    '''
+    with _lock:
+        _clients[service_name] = client
+
+
+def reset_clients() -> None:
+    '''Drop all shared clients so they are rebuilt on next use
+    '''
+    with _lock:
+        _clients.clear()
@@ -14,6 +14,10 @@ class ErrorMsg:
 
     PARSE_ERROR_MODIFY = 'Failed to parse a "MODIFY" event'
 
+    OVERSIZE_RECORD = 'Record exceeds the Firehose record size limit'
+
+    FIREHOSE_PUT_FAILED = 'Firehose rejected a record after all attempts'
+
 
 class CustomException(Exception):
 
@@ -1,81 +1,318 @@
 #! /usr/bin/python3.8 Python3.8
+import concurrent.futures
 import json
 import logging
-import queue
 import os
-from typing import Any, Dict, List, Optional
-
-import boto3
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from aws_clients import get_client
 from error_handling import CustomException, ErrorMsg
+from structured_log import StructuredLogger
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.WARNING)
 
+# Stream events are logged at DEBUG level, a summary at INFO level
+LOG = StructuredLogger.from_env()
+
+# Records that Firehose kept rejecting are spilled to the logs in full
+SPILL_LOG = StructuredLogger(max_field_size=1000 * 1024)
+
 FIREHOSE_ANALYTICAL_STREAM_NAME = os.environ['FIREHOSE_ANALYTICAL_STREAM_NAME']
 FIREHOSE_LIKES_STREAM_NAME = os.environ['FIREHOSE_LIKES_STREAM_NAME']
 FIREHOSE_APIREQUESTS_STREAM_NAME = os.environ['FIREHOSE_APIREQUESTS_STREAM_NAME']  # NOQA
-FIREHOSE_QUOTA = 500
+FIREHOSE_QUOTA = 500  # Max records per put_record_batch call
+FIREHOSE_MAX_BATCH_SIZE = 4 * 1024 * 1024  # Max bytes per call
+FIREHOSE_MAX_RECORD_SIZE = 1000 * 1024  # Max bytes per record
+
+# Destinations are put concurrently, on up to this many threads; the chunks
+# of each destination are put one after the other, in stream order
+FIREHOSE_MAX_WORKERS = int(os.environ.get('FIREHOSE_MAX_WORKERS', 8))
+
+# Records rejected by Firehose (e.g. throttled) are put again, with backoff
+FIREHOSE_MAX_ATTEMPTS = int(os.environ.get('FIREHOSE_MAX_ATTEMPTS', 4))
+FIREHOSE_BACKOFF_BASE = float(os.environ.get('FIREHOSE_BACKOFF_BASE', 0.1))
+FIREHOSE_BACKOFF_CAP = float(os.environ.get('FIREHOSE_BACKOFF_CAP', 2))
+
+# Cached article listings kept in the blog table by lambda_blog; they are
+# deleted whenever new articles come in, so that they get rebuilt
+DYNAMODB_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+SNAPSHOT_ID_PREFIX = 'cache-snapshot#'
+SNAPSHOT_KEYS = ['latest-articles']
+
+# Like request tokens, kept only to dedupe retried likes
+LIKE_TOKEN_ID_PREFIX = 'like-token#'
+
+# Items counting likes for a shard of an article likes counter
+LIKES_SHARD_ITEM_TYPE = 'likes-shard'
+
+# Firehose stream receiving the messages of each destination
+DESTINATIONS = {
+    'articles': FIREHOSE_ANALYTICAL_STREAM_NAME,
+    'likes': FIREHOSE_LIKES_STREAM_NAME,
+    'apirequests': FIREHOSE_APIREQUESTS_STREAM_NAME,
+}
+
+
+class StreamMessage:
+    '''Message parsed from a stream record, bound to a destination; it is
+    serialized once, when created, to batch messages by size
+    '''
+
+    __slots__ = ('destination', 'data', 'sequence_number', 'payload')
+
+    def __init__(
+            self,
+            destination: str,
+            data: dict,
+            sequence_number: Optional[str] = None,
+            ) -> None:
+        self.destination = destination
+        self.data = data
+        self.sequence_number = sequence_number
+        self.payload = json.dumps(data).encode('utf-8')
+
+
+class MessageBatches:
+    '''Messages of a single invocation, accumulated per destination in plain
+    lists (no locking, nothing left over for the next invocation)
+
+    Messages over the Firehose record size limit get their body truncated
+    to fit, or are dropped (and logged) if they have no body to truncate.
+    '''
+
+    __slots__ = ('messages', 'truncated', 'dropped')
+
+    def __init__(self) -> None:
+        self.messages: Dict[str, List[StreamMessage]] = {
+            destination: [] for destination in DESTINATIONS
+        }
+        self.truncated: Dict[str, int] = dict.fromkeys(DESTINATIONS, 0)
+        self.dropped: Dict[str, int] = dict.fromkeys(DESTINATIONS, 0)
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self.messages.values())
+
+    def add(self, message: StreamMessage) -> None:
+        if len(message.payload) > FIREHOSE_MAX_RECORD_SIZE:
+            fitted = truncate_message(
+                message, max_size=FIREHOSE_MAX_RECORD_SIZE)
+
+            if fitted is None:
+                self.dropped[message.destination] += 1
+                return None
+
+            self.truncated[message.destination] += 1
+            message = fitted
+
+        self.messages[message.destination].append(message)
+
+    def chunks(
+            self,
+            destination: str,
+            max_count: int = FIREHOSE_QUOTA,
+            max_size: int = FIREHOSE_MAX_BATCH_SIZE,
+            ) -> Iterator[List[StreamMessage]]:
+        '''Split messages into chunks, in order, as full as the count and
+        size limits allow
+        '''
+        chunk: List[StreamMessage] = []
+        chunk_size = 0
+
+        for message in self.messages[destination]:
+            if len(chunk) >= max_count or \
+                    chunk_size + len(message.payload) > max_size:
+                yield chunk
+                chunk, chunk_size = [], 0
+
+            chunk.append(message)
+            chunk_size += len(message.payload)
 
-articles_queue = queue.Queue()
-likes_queue = queue.Queue()
-apirequests_queue = queue.Queue()
+        if chunk:
+            yield chunk
+
+
+def truncate_message(
+        message: StreamMessage,
+        *,
+        max_size: int,
+        ) -> Optional[StreamMessage]:
+    '''Cut the body of an oversize message so that it fits in max_size
+    bytes, flagging it as truncated; None if it has no body to cut
+    '''
+    body = message.data.get('body')
+
+    while isinstance(body, str) and body:
+        # JSON escaping may take more bytes than the characters cut
+        excess = len(message.payload) - max_size
+
+        if excess <= 0:
+            return message
+
+        body = body[:max(len(body) - excess, 0)]
+        message = StreamMessage(
+            message.destination,
+            {**message.data, 'body': body, 'truncated': True},
+            message.sequence_number,
+        )
+
+    if len(message.payload) <= max_size:
+        return message
+
+    LOG.error(
+        ErrorMsg.OVERSIZE_RECORD,
+        destination=message.destination,
+        id=message.data.get('id'),
+        size=len(message.payload),
+        sequence_number=message.sequence_number,
+    )
+
+    return None
 
 
 def handler(event: dict, context: Any):
     response: Dict[str, Any] = {}
+    started_at = time.monotonic()
+    sampled = LOG.sample()
+
+    records = event.get('Records', [])
+    batches = MessageBatches()
+
+    # Sequence numbers of records to be retried: the event source replays
+    # the batch from the lowest one reported, not the whole batch
+    failures: List[Optional[str]] = []
 
     try:
-        print('REQUEST EVENT:')
-        print(json.dumps(event))
+        LOG.debug('Request event', sampled=sampled, event=event)
 
-        parsers = {
-            'INSERT': parse_new_item,
-            'MODIFY': parse_item_modified,
-        }
+        for record in records:
+            try:
+                message = parse_record(record=record)
 
-        for record in event.get('Records', []):
-            if record['eventSource'] != 'aws:dynamodb':
-                record_parsing_error(ErrorMsg.NOT_DDB_STREAM, record)
-                continue
+            except Exception as error:
+                # Messages parsed so far are still put, the rest is retried
+                logger.exception(error)
 
-            parser = parsers.get(record.get('eventName'))
+                response['error']: str = ErrorMsg.GENERIC_PUBLIC_ERROR
+                failures.append(sequence_number(record=record))
 
-            if parser is None:
-                record_parsing_error(ErrorMsg.UNDEFINED_PARSER, record)
-                continue
+                break
+
+            if message is not None:
+                batches.add(message)
 
-            parser(record=record)
+        if batches.messages['articles']:
+            invalidate_cache_snapshots()
 
-        response['results'] = process_all_queues()
+        response['results'], failed = process_all_batches(batches)
+
+        failures.extend(message.sequence_number for message in failed)
 
     except CustomException as error:
         logger.exception(error)
 
         response['error']: str = error.public_message
+        failures.extend(sequence_number(record=record) for record in records)
 
     except Exception as error:
         logger.exception(error)
 
         response['error']: str = ErrorMsg.GENERIC_PUBLIC_ERROR
+        failures.extend(sequence_number(record=record) for record in records)
 
     finally:
-        print('RESPONSE:')
-        print(json.dumps(response))
+        response['batchItemFailures'] = batch_item_failures(failures)
+
+        LOG.info(
+            'Records processed',
+            sampled=sampled,
+            records=len(records),
+            response=response,
+            duration_ms=round((time.monotonic() - started_at) * 1000, 1),
+        )
 
         return response
 
 
+def parse_record(*, record: dict) -> Optional[StreamMessage]:
+    if record['eventSource'] != 'aws:dynamodb':
+        record_parsing_error(ErrorMsg.NOT_DDB_STREAM, record)
+        return None
+
+    if is_internal_item(record=record):
+        return None
+
+    parser = PARSERS.get(record.get('eventName'))
+
+    if parser is None:
+        record_parsing_error(ErrorMsg.UNDEFINED_PARSER, record)
+        return None
+
+    return parser(record=record)
+
+
+def sequence_number(*, record: dict) -> Optional[str]:
+    return record.get('dynamodb', {}).get('SequenceNumber')
+
+
+def batch_item_failures(
+        sequence_numbers: List[Optional[str]],
+        ) -> List[Dict[str, str]]:
+    '''Partial batch response reporting failed records by sequence number
+    '''
+    return [
+        {'itemIdentifier': number}
+        for number in sorted(
+            {number for number in sequence_numbers if number is not None},
+            key=int,
+        )
+    ]
+
+
+def is_internal_item(*, record: dict) -> bool:
+    '''Whether the record is about a cache snapshot or a like token, which
+    have no analytical value
+    '''
+    keys = record.get('dynamodb', {}).get('Keys', {})
+
+    return keys.get('id', {}).get('S', '').startswith(
+        (SNAPSHOT_ID_PREFIX, LIKE_TOKEN_ID_PREFIX))
+
+
+def invalidate_cache_snapshots() -> None:
+    if not DYNAMODB_TABLE_NAME:
+        return None
+
+    client = get_client('dynamodb')
+
+    for key in SNAPSHOT_KEYS:
+        try:
+            client.delete_item(
+                TableName=DYNAMODB_TABLE_NAME,
+                Key={
+                    'id': {
+                        'S': f'{SNAPSHOT_ID_PREFIX}{key}',
+                    },
+                },
+            )
+        except Exception as error:
+            logger.exception(error)
+
+
 def record_parsing_error(error: str, record: dict) -> None:
     logger.error(f'{error}: {json.dumps(record)}')
 
 
-def parse_new_item(*, record) -> None:
+def parse_new_item(*, record) -> Optional[StreamMessage]:
     item = record['dynamodb']['NewImage']
+    item_type = item.get('item-type', {}).get('S')
+    sequence_number = record['dynamodb'].get('SequenceNumber')
 
-    if item.get('item-type', {}).get('S') == 'blog-article':
-        articles_queue.put({
+    if item_type == 'blog-article':
+        return StreamMessage('articles', {
             'id': record['dynamodb']['Keys']['id']['S'],
             'publish_timestamp': int(
                 item.get('publish-timestamp', {}).get('N')
@@ -85,10 +322,10 @@ def parse_new_item(*, record) -> None:
             'item_type': item.get('item-type', {}).get('S'),
             'title': item.get('title', {}).get('S'),
             'body': item.get('body', {}).get('S'),
-        })
+        }, sequence_number)
 
-    if item.get('item-type', {}).get('S') == 'api-request':
-        apirequests_queue.put({
+    elif item_type == 'api-request':
+        return StreamMessage('apirequests', {
             'id': record['dynamodb']['Keys']['id']['S'],
             'item_type': item.get('item-type', {}).get('S'),
             'http_method': item.get('http-method', {}).get('S'),
@@ -101,7 +338,14 @@ def parse_new_item(*, record) -> None:
             'device_type': item.get('device-type', {}).get('S'),
             'action': item.get('action', {}).get('S'),
             'article_id': item.get('article-id', {}).get('S'),
-        })
+        }, sequence_number)
+
+    elif item_type == LIKES_SHARD_ITEM_TYPE:
+        # First like counted in a shard of an article likes counter
+        return StreamMessage('likes', {
+            'id': item.get('article-id', {}).get('S'),
+            'like': int(item.get('likes', {}).get('N', 0)),
+        }, sequence_number)
 
     # To parse new types of items, just add more conditionals here
 
@@ -109,12 +353,12 @@ def parse_new_item(*, record) -> None:
         record_parsing_error(ErrorMsg.PARSE_ERROR_INSERT, record)
 
 
-def parse_item_modified(*, record) -> None:
+def parse_item_modified(*, record) -> Optional[StreamMessage]:
     if is_like(record=record):
-        likes_queue.put({
-            'id': record['dynamodb']['Keys']['id']['S'],
-            'like': 1,
-        })
+        return StreamMessage('likes', {
+            'id': liked_article_id(record=record),
+            'like': likes_increment(record=record),
+        }, record['dynamodb'].get('SequenceNumber'))
 
     # To parse new types of modifications, just add more conditionals here
 
@@ -123,89 +367,196 @@ def parse_item_modified(*, record) -> None:
 
 
 def is_like(*, record: dict) -> bool:
+    return likes_increment(record=record) > 0
+
+
+def likes_increment(*, record: dict) -> int:
     old_likes = record['dynamodb']['OldImage'].get('likes', {}).get('N')
     new_likes = record['dynamodb']['NewImage'].get('likes', {}).get('N')
 
-    return int(new_likes) > int(old_likes)
-
-
-def process_all_queues():
-    results: dict = {}
-
-    queues_options = {
-        'articles': {
-            'queue': articles_queue,
-            'firehose_stream_name': FIREHOSE_ANALYTICAL_STREAM_NAME,
-        },
-        'likes': {
-            'queue': likes_queue,
-            'firehose_stream_name': FIREHOSE_LIKES_STREAM_NAME,
-        },
-        'apirequests': {
-            'queue': apirequests_queue,
-            'firehose_stream_name': FIREHOSE_APIREQUESTS_STREAM_NAME,
-        },
+    if old_likes is None or new_likes is None:
+        return 0
+
+    return int(new_likes) - int(old_likes)
+
+
+def liked_article_id(*, record: dict) -> str:
+    '''Likes are counted either in the article item or in counter shards,
+    which hold the article ID in the "article-id" attribute
+    '''
+    item = record['dynamodb']['NewImage']
+
+    if item.get('item-type', {}).get('S') == LIKES_SHARD_ITEM_TYPE:
+        return item['article-id']['S']
+
+    return record['dynamodb']['Keys']['id']['S']
+
+
+# Parser of each type of stream event
+PARSERS = {
+    'INSERT': parse_new_item,
+    'MODIFY': parse_item_modified,
+}
+
+
+def process_all_batches(
+        batches: MessageBatches,
+        ) -> Tuple[dict, List[StreamMessage]]:
+    '''Put the chunks of every destination to Firehose, destinations
+    concurrently and the chunks of each one in order; returns the counts of
+    records put, retried, failed and skipped per destination, and the
+    messages that could not be put
+    '''
+    destinations = [
+        destination
+        for destination in DESTINATIONS
+        if batches.messages[destination]
+    ]
+
+    def put_destination(
+            destination: str,
+            ) -> Tuple[Dict[str, int], List[StreamMessage]]:
+        counters = {
+            'records_put': 0,
+            'records_retried': 0,
+            'records_failed': 0,
+            'records_skipped': 0,
+        }
+        failed: List[StreamMessage] = []
+
+        for chunk in batches.chunks(destination):
+            # Not put ahead of failed records, the event source replays them
+            if failed:
+                counters['records_skipped'] += len(chunk)
+                failed.extend(chunk)
+                continue
+
+            chunk_counters, failed = put_records(
+                stream_name=DESTINATIONS[destination],
+                messages=chunk,
+            )
+
+            for name, count in chunk_counters.items():
+                counters[name] += count
+
+        return counters, failed
+
+    if len(destinations) <= 1:
+        outcomes = [put_destination(name) for name in destinations]
+
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(FIREHOSE_MAX_WORKERS, len(destinations)),
+                ) as executor:
+            outcomes = list(executor.map(put_destination, destinations))
+
+    results: dict = {
+        destination: {
+            'records_put': 0,
+            'records_retried': 0,
+            'records_failed': 0,
+            'records_skipped': 0,
+            'truncated_records': batches.truncated[destination],
+            'dropped_records': batches.dropped[destination],
+        }
+        for destination in DESTINATIONS
     }
+    failed: List[StreamMessage] = []
 
-    for data_type, options in queues_options.items():
-        results[data_type]: dict = process_queue(
-            queue_obj=options['queue'],
-            firehose_stream_name=options['firehose_stream_name'],
-        )
+    for destination, (counters, destination_failed) in zip(
+            destinations, outcomes):
+        results[destination].update(counters)
+        failed.extend(destination_failed)
 
-    return results
+    return results, failed
 
 
-def process_queue(
+def put_records(
         *,
-        queue_obj: queue.Queue,
-        firehose_stream_name: str,
-        concurrency_limit: Optional[int] = FIREHOSE_QUOTA,
-        ) -> dict:
-    results: dict = {'firehose_put_records_responses': []}
-
-    messages: list = get_msgs_from_queue(
-        queue_obj=queue_obj,
-        num=concurrency_limit,
-    )
+        stream_name: str,
+        messages: List[StreamMessage],
+        ) -> Tuple[Dict[str, int], List[StreamMessage]]:
+    '''Put messages to Firehose, putting again the records it rejects with
+    exponential backoff and full jitter; returns counters and the messages
+    still rejected after FIREHOSE_MAX_ATTEMPTS, which are spilled to the logs
+    '''
+    counters = {'records_put': 0, 'records_retried': 0, 'records_failed': 0}
+    pending = messages
+    attempt = 0
+
+    while True:
+        attempt += 1
 
-    while len(messages) > 0:
-        response: dict = put_firehose(
-            stream_name=firehose_stream_name,
-            messages=messages,
-        )
+        try:
+            response = put_firehose(
+                stream_name=stream_name,
+                records=[message.payload for message in pending],
+            )
+            errors = failed_put_errors(response=response, count=len(pending))
 
-        results['firehose_put_records_responses'].append(response)
+        except Exception as error:
+            logger.exception(error)
+            errors = [type(error).__name__] * len(pending)
 
-        messages: list = get_msgs_from_queue(
-            queue_obj=queue_obj,
-            num=concurrency_limit,
-        )
+        failed = [
+            (message, error_code)
+            for message, error_code in zip(pending, errors)
+            if error_code is not None
+        ]
 
-    return results
+        counters['records_put'] += len(pending) - len(failed)
 
+        if not failed:
+            return counters, []
 
-def get_msgs_from_queue(*, queue_obj: queue.Queue, num: int) -> list:
-    messages = []
+        if attempt >= FIREHOSE_MAX_ATTEMPTS:
+            counters['records_failed'] += len(failed)
+            spill_records(stream_name=stream_name, failed=failed)
 
-    for i in range(0, num):
-        try:
-            messages.append(queue_obj.get(block=False))
-        except queue.Empty:
-            break
+            return counters, [message for message, _ in failed]
 
-    return messages
+        counters['records_retried'] += len(failed)
+        pending = [message for message, _ in failed]
 
+        time.sleep(random.uniform(0, min(
+            FIREHOSE_BACKOFF_CAP, FIREHOSE_BACKOFF_BASE * 2 ** attempt)))
 
-def put_firehose(stream_name: str, messages: List[dict]) -> dict:
-    client = boto3.client('firehose')
 
-    records = [
-        {'Data': json.dumps(msg).encode('utf-8')}
-        for msg in messages
-    ]
+def failed_put_errors(*, response: dict, count: int) -> List[Optional[str]]:
+    '''Error code of each record of a put_record_batch call, None for the
+    records that were put
+    '''
+    if not response.get('FailedPutCount'):
+        return [None] * count
+
+    entries = response.get('RequestResponses') or []
+
+    # Without per-record responses, every record is assumed to have failed
+    if len(entries) != count:
+        return ['Unknown'] * count
+
+    return [entry.get('ErrorCode') for entry in entries]
+
+
+def spill_records(
+        *,
+        stream_name: str,
+        failed: List[Tuple[StreamMessage, str]],
+        ) -> None:
+    for message, error_code in failed:
+        SPILL_LOG.error(
+            ErrorMsg.FIREHOSE_PUT_FAILED,
+            stream_name=stream_name,
+            error_code=error_code,
+            sequence_number=message.sequence_number,
+            record=lambda: message.payload.decode('utf-8'),
+        )
+
+
+def put_firehose(stream_name: str, records: List[bytes]) -> dict:
+    client = get_client('firehose')
 
     return client.put_record_batch(
         DeliveryStreamName=stream_name,
-        Records=records,
+        Records=[{'Data': data} for data in records],
     )
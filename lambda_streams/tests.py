@@ -1,4 +1,5 @@
 #! /usr/bin/python3.8 Python3.8
+import json
 from unittest import mock
 
 
@@ -13,3 +14,295 @@ def test_full(patch_put_firehose, sample_ddb_streams):
     print(patch_put_firehose.mock_calls)
 
     assert patch_put_firehose.call_count == 2
+
+
+@mock.patch('streams_reader.put_firehose')
+def test_likes_shards(patch_put_firehose):
+    from streams_reader import handler
+
+    patch_put_firehose.return_value = {'patch': 'put_firehose'}
+
+    def shard_image(likes):
+        return {
+            'id': {'S': 'abc#likes-3'},
+            'item-type': {'S': 'likes-shard'},
+            'article-id': {'S': 'abc'},
+            'likes': {'N': str(likes)},
+        }
+
+    def record(event_name, new_likes, old_likes=None):
+        dynamodb = {
+            'Keys': {'id': {'S': 'abc#likes-3'}},
+            'NewImage': shard_image(new_likes),
+        }
+
+        if old_likes is not None:
+            dynamodb['OldImage'] = shard_image(old_likes)
+
+        return {
+            'eventName': event_name,
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': dynamodb,
+        }
+
+    event = {
+        'Records': [
+            record('INSERT', 1),
+            record('MODIFY', 3, 1),
+        ],
+    }
+
+    handler(event=event, context=None)
+
+    assert patch_put_firehose.call_count == 1
+    assert [
+        json.loads(data) for data in patch_put_firehose.call_args[1]['records']
+    ] == [
+        {'id': 'abc', 'like': 1},
+        {'id': 'abc', 'like': 2},
+    ]
+
+
+@mock.patch('streams_reader.put_firehose')
+def test_failed_invocation_leaves_nothing_behind(patch_put_firehose):
+    from streams_reader import handler
+
+    patch_put_firehose.return_value = {'patch': 'put_firehose'}
+
+    like = {
+        'eventName': 'MODIFY',
+        'eventSource': 'aws:dynamodb',
+        'dynamodb': {
+            'Keys': {'id': {'S': 'abc'}},
+            'OldImage': {'likes': {'N': '1'}},
+            'NewImage': {'likes': {'N': '2'}},
+            'SequenceNumber': '100',
+        },
+    }
+    broken_article = {
+        'eventName': 'INSERT',
+        'eventSource': 'aws:dynamodb',
+        'dynamodb': {
+            'Keys': {'id': {'S': 'def'}},
+            'NewImage': {'item-type': {'S': 'blog-article'}},
+            'SequenceNumber': '200',
+        },
+    }
+
+    response = handler(
+        event={'Records': [like, broken_article, like]}, context=None)
+
+    # Records parsed before the failure are put, the rest is replayed
+    assert 'error' in response
+    assert response['batchItemFailures'] == [{'itemIdentifier': '200'}]
+    assert patch_put_firehose.call_count == 1
+    assert len(patch_put_firehose.call_args[1]['records']) == 1
+
+    # Nothing from the failed invocation leaks into this one
+    response = handler(event={'Records': []}, context=None)
+
+    assert patch_put_firehose.call_count == 1
+    assert response['batchItemFailures'] == []
+
+
+@mock.patch('streams_reader.put_firehose')
+def test_concurrent_fan_out(patch_put_firehose):
+    import threading
+    import time
+
+    from streams_reader import FIREHOSE_LIKES_STREAM_NAME, handler
+
+    # Passed only while both destinations are being put at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def put_firehose(stream_name, records):
+        first = json.loads(records[0])['id']
+
+        if first in ['a0', 'b0']:
+            barrier.wait()
+
+        # A slow first chunk doesn't let later chunks overtake it
+        time.sleep(0.05 if first == 'a0' else 0)
+
+        return {'FailedPutCount': 0}
+
+    patch_put_firehose.side_effect = put_firehose
+
+    records = [
+        {
+            'eventName': 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': {'id': {'S': f'a{number}'}},
+                'OldImage': {'likes': {'N': '1'}},
+                'NewImage': {'likes': {'N': '2'}},
+            },
+        }
+        for number in range(1200)
+    ]
+    records.append({
+        'eventName': 'INSERT',
+        'eventSource': 'aws:dynamodb',
+        'dynamodb': {
+            'Keys': {'id': {'S': 'b0'}},
+            'NewImage': {
+                'item-type': {'S': 'blog-article'},
+                'publish-timestamp': {'N': '1594596504'},
+            },
+        },
+    })
+
+    response = handler(event={'Records': records}, context=None)
+
+    assert response['results']['likes']['records_put'] == 1200
+    assert response['results']['articles']['records_put'] == 1
+    assert [
+        (len(call[1]['records']), json.loads(call[1]['records'][0])['id'])
+        for call in patch_put_firehose.call_args_list
+        if call[1]['stream_name'] == FIREHOSE_LIKES_STREAM_NAME
+    ] == [(500, 'a0'), (500, 'a500'), (200, 'a1000')]
+    assert not barrier.broken
+
+
+@mock.patch('streams_reader.time.sleep')
+@mock.patch('streams_reader.put_firehose')
+def test_chunks_after_failure_skipped(patch_put_firehose, patch_sleep):
+    from streams_reader import handler
+
+    patch_put_firehose.side_effect = RuntimeError('throttled')
+
+    records = [
+        {
+            'eventName': 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': {'id': {'S': f'a{number}'}},
+                'OldImage': {'likes': {'N': '1'}},
+                'NewImage': {'likes': {'N': '2'}},
+                'SequenceNumber': str(100 + number),
+            },
+        }
+        for number in range(600)
+    ]
+
+    response = handler(event={'Records': records}, context=None)
+
+    # The second chunk is replayed along with the first, never put before
+    assert response['results']['likes']['records_failed'] == 500
+    assert response['results']['likes']['records_skipped'] == 100
+    assert all(
+        json.loads(call[1]['records'][0])['id'] == 'a0'
+        for call in patch_put_firehose.call_args_list
+    )
+    assert response['batchItemFailures'][0] == {'itemIdentifier': '100'}
+    assert len(response['batchItemFailures']) == 600
+
+
+def test_size_aware_batching():
+    from streams_reader import (
+        FIREHOSE_MAX_RECORD_SIZE,
+        MessageBatches,
+        StreamMessage,
+    )
+
+    batches = MessageBatches()
+
+    for number in range(6):
+        batches.add(StreamMessage('articles', {
+            'id': str(number),
+            'body': 'x' * 900_000,
+        }))
+
+    # Oversize bodies are cut to fit, messages without one are dropped
+    batches.add(StreamMessage('articles', {
+        'id': 'big',
+        'body': 'é' * FIREHOSE_MAX_RECORD_SIZE,
+    }))
+    batches.add(StreamMessage('likes', {
+        'id': 'x' * FIREHOSE_MAX_RECORD_SIZE,
+        'like': 1,
+    }))
+
+    chunks = list(batches.chunks('articles'))
+    big = chunks[-1][-1]
+
+    assert [len(chunk) for chunk in chunks] == [4, 3]
+    assert all(
+        sum(len(message.payload) for message in chunk) <= 4 * 1024 * 1024
+        for chunk in chunks
+    )
+    assert big.data['truncated'] is True
+    assert len(big.payload) <= FIREHOSE_MAX_RECORD_SIZE
+    assert batches.truncated['articles'] == 1
+    assert batches.dropped['likes'] == 1
+    assert list(batches.chunks('likes')) == []
+
+    # Count limit still applies to small messages
+    for number in range(501):
+        batches.add(StreamMessage('likes', {'id': str(number), 'like': 1}))
+
+    assert [len(chunk) for chunk in batches.chunks('likes')] == [500, 1]
+
+
+@mock.patch('streams_reader.time.sleep')
+@mock.patch('streams_reader.put_firehose')
+def test_failed_put_retries(patch_put_firehose, patch_sleep, capsys):
+    from streams_reader import FIREHOSE_MAX_ATTEMPTS, handler
+
+    def put_firehose(stream_name, records):
+        # Firehose keeps throttling the like of article "b"
+        entries = [
+            {'ErrorCode': 'ServiceUnavailableException'}
+            if json.loads(data)['id'] == 'b' else {'RecordId': '1'}
+            for data in records
+        ]
+
+        return {
+            'FailedPutCount': sum('ErrorCode' in entry for entry in entries),
+            'RequestResponses': entries,
+        }
+
+    patch_put_firehose.side_effect = put_firehose
+
+    records = [
+        {
+            'eventName': 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'dynamodb': {
+                'Keys': {'id': {'S': article_id}},
+                'OldImage': {'likes': {'N': '1'}},
+                'NewImage': {'likes': {'N': '2'}},
+                'SequenceNumber': f'{number}00',
+            },
+        }
+        for number, article_id in enumerate(['a', 'b', 'c'])
+    ]
+
+    response = handler(event={'Records': records}, context=None)
+
+    assert response['results']['likes'] == {
+        'records_put': 2,
+        'records_retried': FIREHOSE_MAX_ATTEMPTS - 1,
+        'records_failed': 1,
+        'records_skipped': 0,
+        'truncated_records': 0,
+        'dropped_records': 0,
+    }
+
+    # Only the rejected record is put again
+    assert [
+        len(call[1]['records'])
+        for call in patch_put_firehose.call_args_list
+    ] == [3] + [1] * (FIREHOSE_MAX_ATTEMPTS - 1)
+    assert patch_sleep.call_count == FIREHOSE_MAX_ATTEMPTS - 1
+
+    spilled = [
+        json.loads(line)
+        for line in capsys.readouterr().out.splitlines()
+        if '"level":"ERROR"' in line
+    ]
+
+    assert len(spilled) == 1
+    assert spilled[0]['sequence_number'] == '100'
+    assert response['batchItemFailures'] == [{'itemIdentifier': '100'}]
+    assert json.loads(spilled[0]['record']) == {'id': 'b', 'like': 1}
@@ -20,22 +20,22 @@ setuptools.setup(
     packages=setuptools.find_packages(where="sls_website"),
 
     install_requires=[
-        "aws-cdk.core==1.51.0",
-        "aws-cdk.aws-apigateway==1.51.0",
-        "aws-cdk.aws-athena==1.51.0",
-        "aws-cdk.aws-cloudfront==1.51.0",
-        "aws-cdk.aws-dynamodb==1.51.0",
-        "aws-cdk.aws-glue==1.51.0",
-        "aws-cdk.aws-iam==1.51.0",
-        "aws-cdk.aws-kinesisfirehose==1.51.0",
-        "aws-cdk.aws-lambda==1.51.0",
-        "aws-cdk.aws-lambda-destinations==1.51.0",
-        "aws-cdk.aws-lambda-event-sources==1.51.0",
-        "aws-cdk.aws-logs==1.50",
-        "aws-cdk.aws-s3==1.51.0",
-        "aws-cdk.aws-s3-deployment==1.51.0",
-        "aws-cdk.aws-sqs==1.51.0",
-        "boto3==1.14.11",
+        "aws-cdk.core==1.204.0",
+        "aws-cdk.aws-apigateway==1.204.0",
+        "aws-cdk.aws-athena==1.204.0",
+        "aws-cdk.aws-cloudfront==1.204.0",
+        "aws-cdk.aws-dynamodb==1.204.0",
+        "aws-cdk.aws-glue==1.204.0",
+        "aws-cdk.aws-iam==1.204.0",
+        "aws-cdk.aws-kinesisfirehose==1.204.0",
+        "aws-cdk.aws-lambda==1.204.0",
+        "aws-cdk.aws-lambda-event-sources==1.204.0",
+        "aws-cdk.aws-logs==1.204.0",
+        "aws-cdk.aws-s3==1.204.0",
+        "aws-cdk.aws-s3-deployment==1.204.0",
+        "aws-cdk.aws-secretsmanager==1.204.0",
+        "aws-cdk.aws-sqs==1.204.0",
+        "boto3==1.26.16",
         "pytest==5.4.3",
     ],
 
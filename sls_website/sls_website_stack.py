@@ -9,11 +9,11 @@ from aws_cdk import (
     aws_glue,
     aws_kinesisfirehose as aws_firehose,
     aws_lambda,
-    aws_lambda_destinations,
     aws_lambda_event_sources,
     aws_logs,
     aws_s3,
     aws_s3_deployment,
+    aws_secretsmanager,
     aws_sqs,
 )
 
@@ -146,6 +146,7 @@ class SlsBlogApiStack(core.Stack):
 
         # DynamoDB Indexes
         self.ddb_gsi_latest = None  # GSI ordering articles by timestamp
+        self.ddb_gsi_latest_summary = None  # Same as above, without bodies
 
         # Lambda Functions
         self.lambda_blog = None  # Serves requests to the blog public API
@@ -159,10 +160,12 @@ class SlsBlogApiStack(core.Stack):
 
     def create_cdk_resources(self) -> None:
         self.create_queues()
+        self.create_secrets()
         self.create_dynamodb()
         self.create_lambdas()
         self.create_rest_apis()
         self.grant_dynamodb_permissions()
+        self.grant_secrets_permissions()
 
     def create_queues(self) -> None:
         '''SQS Queues
@@ -174,6 +177,20 @@ class SlsBlogApiStack(core.Stack):
             visibility_timeout=core.Duration.minutes(15),  # Max Lambda timeout
         )
 
+    def create_secrets(self) -> None:
+        '''Secrets Manager Secrets
+        '''
+        # Random key signing the pagination cursors returned by the blog API
+        self.secret_cursor_signing_key = aws_secretsmanager.Secret(
+            self,
+            'sls-blog-cursor-signing-key',
+            description='Key signing the pagination cursors of the blog API',
+            generate_secret_string=aws_secretsmanager.SecretStringGenerator(
+                exclude_punctuation=True,
+                password_length=64,
+            ),
+        )
+
     def create_dynamodb(self) -> None:
         '''DynamoDB Tables and Event Sources
         '''
@@ -214,6 +231,30 @@ class SlsBlogApiStack(core.Stack):
             projection_type=aws_dynamodb.ProjectionType.ALL,
         )
 
+        # GSI with the same ordering, projecting only what article summaries
+        # need (no article body), to cut read capacity on summary listings
+        self.ddb_gsi_latest_summary = 'latest-blogs-summary'
+
+        self.ddb_table_blog.add_global_secondary_index(
+            index_name=self.ddb_gsi_latest_summary,
+            partition_key=aws_dynamodb.Attribute(
+                name='item-type',
+                type=aws_dynamodb.AttributeType.STRING,
+            ),
+            sort_key=aws_dynamodb.Attribute(
+                name='publish-timestamp',
+                type=aws_dynamodb.AttributeType.NUMBER,
+            ),
+            projection_type=aws_dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=[
+                'publisher-email',
+                'publisher-name',
+                'title',
+                'likes',
+                'excerpt',
+            ],
+        )
+
         # Generate streams from modifications to the "blog" DDB Table
         self.ddb_source_blog = aws_lambda_event_sources.DynamoEventSource(
             table=self.ddb_table_blog,
@@ -222,7 +263,11 @@ class SlsBlogApiStack(core.Stack):
             max_batching_window=core.Duration.seconds(60),
             parallelization_factor=self.ddb_param_max_parallel_streams,
             retry_attempts=2,
-            on_failure=aws_lambda_destinations.SqsDestination(
+            # The handler reports the sequence number of failed records, so
+            # that only the batch tail from the first one is retried
+            report_batch_item_failures=True,
+            bisect_batch_on_error=True,
+            on_failure=aws_lambda_event_sources.SqsDlq(
                 self.queue_ddb_streams_dlq),
         )
 
@@ -244,9 +289,19 @@ class SlsBlogApiStack(core.Stack):
             environment={
                 'DYNAMODB_TABLE_NAME': self.ddb_table_blog.table_name,
                 'DYNAMODB_LATEST_ARTICLES_INDEX': self.ddb_gsi_latest,
+                'DYNAMODB_SUMMARY_ARTICLES_INDEX':
+                    self.ddb_gsi_latest_summary,
                 'DYNAMODB_TTL_ATTR_NAME': self.ddb_attr_time_to_live,
                 'DYNAMODB_TTL_DURATION': str(60*60*24*30),  # 30 days
                 'STATIC_WEBSITE_DOMAIN': self.static_stack.cdn.domain_name,
+                'REQUEST_LOG_MODE': 'async',
+                'SHARED_CACHE_BACKEND': 'dynamodb',
+                'SHARED_CACHE_TTL': str(60),
+                'LIKES_SHARD_COUNT': str(0),  # Set above 0 for viral articles
+                'CURSOR_SIGNING_KEY_SECRET_ARN':
+                    self.secret_cursor_signing_key.secret_arn,
+                'LOG_LEVEL': 'INFO',  # 'DEBUG' also logs full payloads
+                'LOG_SAMPLE_RATE': str(1),
             },
         )
 
@@ -261,7 +316,10 @@ class SlsBlogApiStack(core.Stack):
             log_retention=aws_logs.RetentionDays.ONE_WEEK,
             reserved_concurrent_executions=self.ddb_param_max_parallel_streams,
             events=[self.ddb_source_blog],
-            environment={},
+            environment={
+                'DYNAMODB_TABLE_NAME': self.ddb_table_blog.table_name,
+                'LOG_LEVEL': 'INFO',
+            },
         )
 
     def create_rest_apis(self) -> None:
@@ -283,6 +341,14 @@ class SlsBlogApiStack(core.Stack):
         '''
         self.ddb_table_blog.grant_read_write_data(self.lambda_blog)
 
+        # Streams reader deletes cached article snapshots when they change
+        self.ddb_table_blog.grant_write_data(self.lambda_streams_reader)
+
+    def grant_secrets_permissions(self) -> None:
+        '''Grant permissions to read Secrets Manager Secrets
+        '''
+        self.secret_cursor_signing_key.grant_read(self.lambda_blog)
+
 
 class SlsBlogAnalyticalStack(core.Stack):
 
@@ -1117,24 +1183,22 @@ class SlsBlogAnalyticalStack(core.Stack):
         )
 
     def create_athena_resources(self) -> None:
-        self.athena_workgroup = aws_athena.CfnWorkGroup(
+        # Short version of a long CDK Class
+        WorkGroup = aws_athena.CfnWorkGroup
+
+        self.athena_workgroup = WorkGroup(
             self,
             'SlsBlogAthenaWorkgroup',
             name='sls-blog-athena-workgroup',
             description='Serverless Website demo project (by Dashbird)',
             recursive_delete_option=True,
             state='ENABLED',
-            work_group_configuration_updates=core.CfnJson(
-                self,
-                'sls-blog-workgroup-config-updates',
-                value={
-                    'EnforceWorkGroupConfiguration': True,
-                    'BytesScannedCutoffPerQuery': DataSize.gigabytes(1),
-                    'PublishCloudWatchMetricsEnabled': True,
-                    'ResultConfigurationUpdates': {
-                        'OutputLocation':
-                            f's3://{self.bucket_queries.bucket_name}/',
-                    },
-                },
+            work_group_configuration=WorkGroup.WorkGroupConfigurationProperty(
+                enforce_work_group_configuration=True,
+                bytes_scanned_cutoff_per_query=DataSize.gigabytes(1),
+                publish_cloud_watch_metrics_enabled=True,
+                result_configuration=WorkGroup.ResultConfigurationProperty(
+                    output_location=f's3://{self.bucket_queries.bucket_name}/',
+                ),
             ),
         )
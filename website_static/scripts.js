@@ -1,4 +1,5 @@
 const baseURL = 'https://v8cc3f6f0j.execute-api.us-east-1.amazonaws.com/api/'
+const maxLikeAttempts = 3
 const template = _.template('<div class="blog-post"><h2 class="blog-post-title"><%= title %></h2><p class="blog-post-meta"><%= publishDate %> by <b><a href="maito:<%= email %>"><%= author %></a></b></p><div class="article-body"><%= body %></div><p><a id="like-btn-<%= articleID %>" class="button like-btn" href="javascript:void(0)" onclick="likeArticle(\'<%= articleID %>\')">Like it (<%= likes %>)</a></p></div>')
 
 let blogPostsContainer = document.getElementById('blog-posts-container')
@@ -49,28 +50,51 @@ function loadBlogs() {
         })
 }
 
-function likeArticle(articleID) {
+function likeArticle(articleID, requestToken=null, attempt=1) {
     let url = new URL(baseURL)
 
     url.searchParams.append('action', 'like-article')
 
+    // Retries of the same like reuse its token, so it's counted only once
+    if(requestToken === null)
+        requestToken = Array.from(
+            crypto.getRandomValues(new Uint32Array(4)),
+            n => n.toString(16).padStart(8, '0')
+        ).join('')
+
     let options = {
         method: 'POST',
         headers: {
             'Content-Type': 'plain/text'
         },
-        body: JSON.stringify({'article_id': articleID})
+        body: JSON.stringify({
+            'article_id': articleID,
+            'request_token': requestToken
+        })
     }
 
     let articleLikeBtn = document.getElementById(`like-btn-${articleID}`)
 
     fetch(url, options)
-        .then(res => res.json())
+        .then(res => {
+            if(res.status >= 500)
+                throw `Like request failed with status ${res.status}`
+            return res.json()
+        })
         .then(res => {
             articleLikeBtn.innerHTML = `Like it (${res.data.new_likes_count})`
         })
         .catch(err => {
             console.error(err)
+
+            if(attempt < maxLikeAttempts) {
+                setTimeout(
+                    () => likeArticle(articleID, requestToken, attempt + 1),
+                    Math.random() * 500 * 2 ** attempt
+                )
+                return
+            }
+
             alert('Sorry, there was an error!')
         })
 }